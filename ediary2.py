@@ -1,7 +1,10 @@
 
-import sqlite3
 import os
-import pandas as pd
+
+import ediary2_db
+import ediary2_catalog
+import ediary2_profiling
+import ediary2_helpers
 
 ### General .db import and schema
 
@@ -9,450 +12,214 @@ import pandas as pd
 def print_schema(db_file):
     """Retrieve all tables in .db file and print their schema"""
 
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-    
-    # Get the schema of the database
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    
-    # Fetch all the table names
-    tables = cursor.fetchall()
-    
-    # Print schema for each table
-    for table in tables:
-        print(f"Schema for table: {table[0]}")
-        cursor.execute(f"PRAGMA table_info({table[0]});")
-        
-        # Fetch and print column details for the current table
-        columns = cursor.fetchall()
-        for column in columns:
-            print(f"Column Name: {column[1]}, Type: {column[2]}, Not Null: {column[3]}, Default Value: {column[4]}")
-        print("-" * 40)
-    
-    # Close the connection
-    conn.close()
+    # Borrow a cursor on the shared read-only connection
+    with ediary2_db.read_cursor(db_file) as cursor:
+        # Get the schema of the database
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
+
+        # Fetch all the table names
+        tables = cursor.fetchall()
+
+        # Print schema for each table
+        for table in tables:
+            print(f"Schema for table: {table[0]}")
+            cursor.execute(f"PRAGMA table_info({table[0]});")
+
+            # Fetch and print column details for the current table
+            columns = cursor.fetchall()
+            for column in columns:
+                print(f"Column Name: {column[1]}, Type: {column[2]}, Not Null: {column[3]}, Default Value: {column[4]}")
+            print("-" * 40)
 
 # Function to retrieve all data from a specified table
+@ediary2_profiling.profiled
 def retrieve_all_data(db_file, table_name):
     """Retrieve all the data from a given table in the .db file --> returns a pd.DataFrame"""
 
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-    
-    # Retrieve all data from the specified table
-    cursor.execute(f"SELECT * FROM {table_name}")
-    
-    # Fetch all rows from the table
-    rows = cursor.fetchall()
+    # Borrow a cursor on the shared read-only connection
+    with ediary2_db.read_cursor(db_file) as cursor:
+        cursor.execute(f"PRAGMA table_info({table_name});")
+        n_columns = len(cursor.fetchall())
+
+    # Rows are fetched chunk by chunk (no fetchall), columns stay labelled by position
+    return ediary2_helpers._read_query(db_file, f"SELECT * FROM {table_name}", [], list(range(n_columns)), utc=False)
+
+### Event table queries
+
+def _retrieve_event_rows(db_file, table_name, platform_id, sensor_ids, columns, run_id=None, start=None, end=None):
+    """Retrieve the rows of a platformId and one or more sensorIds from an event table and returns pd.DataFrame
 
-    # Close the connection
-    conn.close()
+    run_id and the [start, end] time range (both bounds inclusive, optional) are
+    pushed down into SQL so only the selected participant's rows are read. Rows are
+    fetched chunk by chunk into arrays sized with the schema catalog's row counts.
+    """
 
-    return pd.DataFrame(rows)
+    where, params = ediary2_helpers._event_filter(platform_id, sensor_ids, run_id, start, end)
 
+    counts = ediary2_catalog.sensor_counts(db_file, table_name, platform_id, run_id)
+    capacity = None if counts is None else sum(counts.get(sensor_id, 0) for sensor_id in sensor_ids)
+
+    return ediary2_helpers._read_query(db_file, f'SELECT * FROM {table_name} WHERE {where}', params, columns,
+                                       capacity=capacity, utc=False)
 
 ### Smartphone Data
 
-def retrieve_location_data(db_file, table_name = 'locationEventData'):
+@ediary2_profiling.profiled
+def retrieve_location_data(db_file, table_name = 'locationEventData', run_id=None, start=None, end=None):
     """Retrieve location from .db file and returns pd.DataFrame"""
 
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {1} AND ' \
-                    f'sensorId = {900}')
-    
-    # Fetch all rows from the table
-    data = cursor.fetchall()
-    
-    # Close the connection
-    conn.close()
-
-    df = pd.DataFrame(data, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", 
-                                     "latitude", "longitude", "altitude", "mslAltitude", "bearing", "speed", 
-                                     "locationAccuracy", "bearingAccuracy", "speedAccuracy",
-                                     "mslAltitudeAccuracy", "verticalAccuracy"])
+    df = _retrieve_event_rows(db_file, table_name, 1, [900], ediary2_helpers.LOCATION_COLUMNS, run_id, start, end)
 
     return df
 
 ### Feedback / Survey Data
 
-def retrieve_feedback_data(db_file, table_name = 'feedbackEventData'):
+@ediary2_profiling.profiled
+def retrieve_feedback_data(db_file, table_name = 'feedbackEventData', run_id=None, start=None, end=None):
     """Retrieve survey feedback from .db file and returns pd.DataFrame"""
 
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {1} AND ' \
-                    f'sensorId = {800}')
-    
-    # Fetch all rows from the table
-    data = cursor.fetchall()
-
-    conn.close()
-
-    df = pd.DataFrame(data, columns=["original_idx", "runID", "feelingDefinitionId", "causeDefinitionId",
-                                     "feelingDescription", "causeDescription", "intensity", "note",
-                                     "timestamp",  
-                                     "latitude", "longitude", "altitude", "mslAltitude", "bearing", "speed", 
-                                     "locationAccuracy", "bearingAccuracy", "speedAccuracy",
-                                     "mslAltitudeAccuracy", "verticalAccuracy",
-                                     "platformID", "sensorID"
-                                     ])
+    df = _retrieve_event_rows(db_file, table_name, 1, [800], ediary2_helpers.FEEDBACK_COLUMNS, run_id, start, end)
 
     return df
 
 ### Zephyr BioHarness chest strap data 
 
-def retrieve_all_bwa_data(db_file, table_name = 'doubleEventData'):
+@ediary2_profiling.profiled
+def retrieve_all_bwa_data(db_file, table_name = 'doubleEventData', run_id=None, start=None, end=None):
     """Retrieve Breathing Wave Amplitude (BWA) from .db file and returns pd.DataFrame"""
 
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {8}')
-    
-    # Fetch all rows from the table
-    rows = cursor.fetchall()
-    
-    # Close the connection
-    conn.close()
-
-    data = pd.DataFrame(rows, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "BWA"])
+    data = _retrieve_event_rows(db_file, table_name, 2, [8],
+           ["original_idx", "runID", "timestamp", "platformID", "sensorID", "BWA"],
+           run_id, start, end)
 
     return data 
 
-def retrieve_all_ecg_amplitude_data(db_file, table_name = 'doubleEventData'):
+@ediary2_profiling.profiled
+def retrieve_all_ecg_amplitude_data(db_file, table_name = 'doubleEventData', run_id=None, start=None, end=None):
     """Retrieve ECG Amplitude from .db file and returns pd.DataFrame"""
 
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {9}')
-    
-    # Fetch all rows from the table
-    rows = cursor.fetchall()
-
-    # Close the connection
-    conn.close()
-
-    data = pd.DataFrame(rows, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "ecg_ampl"])
+    data = _retrieve_event_rows(db_file, table_name, 2, [9],
+           ["original_idx", "runID", "timestamp", "platformID", "sensorID", "ecg_ampl"],
+           run_id, start, end)
 
     return data 
 
-def retrieve_all_ecg_noise_data(db_file, table_name = 'doubleEventData'):
+@ediary2_profiling.profiled
+def retrieve_all_ecg_noise_data(db_file, table_name = 'doubleEventData', run_id=None, start=None, end=None):
     """Retrieve ECG Noise from .db file and returns pd.DataFrame"""
 
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {10}')
-    
-    # Fetch all rows from the table
-    rows = cursor.fetchall()
-    
-    # Close the connection
-    conn.close()
-
-    data = pd.DataFrame(rows, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "ecg_noise"])
+    data = _retrieve_event_rows(db_file, table_name, 2, [10],
+           ["original_idx", "runID", "timestamp", "platformID", "sensorID", "ecg_noise"],
+           run_id, start, end)
 
     return data 
 
-def retrieve_all_resp_rate_data(db_file, table_name = 'doubleEventData'):
+@ediary2_profiling.profiled
+def retrieve_all_resp_rate_data(db_file, table_name = 'doubleEventData', run_id=None, start=None, end=None):
     """Retrieve respiration rate from .db file and returns pd.DataFrame"""
 
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {2}')
-    
-    # Fetch all rows from the table
-    rows = cursor.fetchall()
-    
-    # Close the connection
-    conn.close()
-
-    data = pd.DataFrame(rows, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "resp_rate"])
+    data = _retrieve_event_rows(db_file, table_name, 2, [2],
+           ["original_idx", "runID", "timestamp", "platformID", "sensorID", "resp_rate"],
+           run_id, start, end)
 
     return data 
 
 
-def retrieve_all_heart_rate_data(db_file, table_name = 'longEventData'):
-    """Retrieve respiration rate from .db file and returns pd.DataFrame"""
-
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {1}')
-    
-    # Fetch all rows from the table
-    rows = cursor.fetchall()
-
-    
-    # Close the connection
-    conn.close()
+@ediary2_profiling.profiled
+def retrieve_all_heart_rate_data(db_file, table_name = 'longEventData', run_id=None, start=None, end=None):
+    """Retrieve heart rate from .db file and returns pd.DataFrame"""
 
-    data = pd.DataFrame(rows, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "heart_rate"])
+    data = _retrieve_event_rows(db_file, table_name, 2, [1],
+           ["original_idx", "runID", "timestamp", "platformID", "sensorID", "heart_rate"],
+           run_id, start, end)
 
     return data
 
 
-def retrieve_all_posture_data(db_file, table_name = 'longEventData'):
+@ediary2_profiling.profiled
+def retrieve_all_posture_data(db_file, table_name = 'longEventData', run_id=None, start=None, end=None):
     """Retrieve posture from .db file and returns pd.DataFrame"""
 
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {4}')
-    
-    # Fetch all rows from the table
-    rows = cursor.fetchall()
-
-    
-    # Close the connection
-    conn.close()
-
-    data = pd.DataFrame(rows, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "posture"])
+    data = _retrieve_event_rows(db_file, table_name, 2, [4],
+           ["original_idx", "runID", "timestamp", "platformID", "sensorID", "posture"],
+           run_id, start, end)
 
     return data 
 
-def retrieve_all_color_data(db_file, table_name = 'longEventData'):
+@ediary2_profiling.profiled
+def retrieve_all_color_data(db_file, table_name = 'longEventData', run_id=None, start=None, end=None):
     """Retrieve BioHarness color (red, orange, green) from .db file and returns pd.DataFrame"""
 
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {6}')
-    
-    # Fetch all rows from the table
-    rows = cursor.fetchall()
-
-    
-    # Close the connection
-    conn.close()
-
-    data = pd.DataFrame(rows, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "color"])
+    data = _retrieve_event_rows(db_file, table_name, 2, [6],
+           ["original_idx", "runID", "timestamp", "platformID", "sensorID", "color"],
+           run_id, start, end)
 
     return data 
 
-def retrieve_all_vector_mag_units_data(db_file, table_name = 'doubleEventData'):
+@ediary2_profiling.profiled
+def retrieve_all_vector_mag_units_data(db_file, table_name = 'doubleEventData', run_id=None, start=None, end=None):
     """Retrieve vector magnitude units from .db file and returns pd.DataFrame"""
 
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {12}')
-    
-    # Fetch all rows from the table
-    rows = cursor.fetchall()
-
-    
-    # Close the connection
-    conn.close()
-
-    data = pd.DataFrame(rows, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "vector_mag_u"])
+    data = _retrieve_event_rows(db_file, table_name, 2, [12],
+           ["original_idx", "runID", "timestamp", "platformID", "sensorID", "vector_mag_u"],
+           run_id, start, end)
 
     return data 
 
-def retrieve_all_worn_status_data(db_file, table_name = 'longEventData'):
+@ediary2_profiling.profiled
+def retrieve_all_worn_status_data(db_file, table_name = 'longEventData', run_id=None, start=None, end=None):
     """Retrieve status if device was worn from .db file and returns pd.DataFrame"""
 
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {13}')
-    
-    # Fetch all rows from the table
-    rows = cursor.fetchall()
-
-    # Close the connection
-    conn.close()
-
-    data = pd.DataFrame(rows, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "worn_status"])
+    data = _retrieve_event_rows(db_file, table_name, 2, [13],
+           ["original_idx", "runID", "timestamp", "platformID", "sensorID", "worn_status"],
+           run_id, start, end)
 
     return data 
 
-def retrieve_all_peak_acc_data(db_file, table_name = 'doubleEventData'):
+@ediary2_profiling.profiled
+def retrieve_all_peak_acc_data(db_file, table_name = 'doubleEventData', run_id=None, start=None, end=None):
     """Retrieve peaks of acceleration from .db file and returns pd.DataFrame"""
 
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {5}')
-    
-    # Fetch all rows from the table
-    rows = cursor.fetchall()
-    
-    # Close the connection
-    conn.close()
-
-    data = pd.DataFrame(rows, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "peak_acc"])
+    data = _retrieve_event_rows(db_file, table_name, 2, [5],
+           ["original_idx", "runID", "timestamp", "platformID", "sensorID", "peak_acc"],
+           run_id, start, end)
 
     return data 
 
-def retrieve_all_acc_min_data(db_file, table_name = 'doubleEventData'):
-    """Retrieve mins of acceleration from .db file and returns pd.DataFrame"""
-
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-    
-
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {101}')
-    
-    # Fetch all rows from the table
-    rows_acc_x_min = cursor.fetchall()
+@ediary2_profiling.profiled
+def retrieve_all_acc_min_data(db_file, table_name = 'doubleEventData', run_id=None, start=None, end=None, complete_only=True):
+    """Retrieve mins of acceleration from .db file and returns pd.DataFrame (one row per sample)"""
 
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {102}')
+    # All three axes in one query, aligned per (runID, timestamp) without joins
+    data_acc_min = _retrieve_event_rows(db_file, table_name, 2, [101, 102, 103],
+                   ["original_idx", "runID", "timestamp", "platformID", "sensorID", "value"],
+                   run_id, start, end)
 
-    rows_acc_y_min = cursor.fetchall()
-
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {103}')
-
-    rows_acc_z_min = cursor.fetchall()
-    
-    conn.close()
-
-    data_x = pd.DataFrame(rows_acc_x_min, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "acc_min_x"])
-    data_y = pd.DataFrame(rows_acc_y_min, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "acc_min_y"])
-    data_z = pd.DataFrame(rows_acc_z_min, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "acc_min_z"])
-
-    data_acc_min_xy = pd.merge(data_x, data_y[["timestamp", "acc_min_y"]])
-    data_acc_min_xyz = pd.merge(data_acc_min_xy, data_z[["timestamp", "acc_min_z"]])
+    data_acc_min_xyz = ediary2_helpers.pivot_axes(data_acc_min, {101: "acc_min_x", 102: "acc_min_y", 103: "acc_min_z"},
+                                                  complete_only)
 
     return data_acc_min_xyz
 
-def retrieve_all_acc_peak_data(db_file, table_name = 'doubleEventData'):
-    """Retrieve respiration rate from .db file and returns pd.DataFrame"""
-
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
+@ediary2_profiling.profiled
+def retrieve_all_acc_peak_data(db_file, table_name = 'doubleEventData', run_id=None, start=None, end=None, complete_only=True):
+    """Retrieve peaks of acceleration (x, y, z) from .db file and returns pd.DataFrame (one row per sample)"""
 
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {111}')
-    
-    # Fetch all rows from the table
-    rows_acc_x_min = cursor.fetchall()
+    # All three axes in one query, aligned per (runID, timestamp) without joins
+    data_acc_peak = _retrieve_event_rows(db_file, table_name, 2, [111, 112, 113],
+                    ["original_idx", "runID", "timestamp", "platformID", "sensorID", "value"],
+                    run_id, start, end)
 
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {112}')
-
-    rows_acc_y_min = cursor.fetchall()
-
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {113}')
-
-    rows_acc_z_min = cursor.fetchall()
-    
-    # Close the connection
-    conn.close()
-
-    data_x = pd.DataFrame(rows_acc_x_min, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "acc_peak_x"])
-    data_y = pd.DataFrame(rows_acc_y_min, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "acc_peak_y"])
-    data_z = pd.DataFrame(rows_acc_z_min, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "acc_peak_z"])
-
-    data_acc_peak_xy = pd.merge(data_x, data_y[["timestamp", "acc_peak_y"]])
-    data_acc_peak_xyz = pd.merge(data_acc_peak_xy, data_z[["timestamp", "acc_peak_z"]])
+    data_acc_peak_xyz = ediary2_helpers.pivot_axes(data_acc_peak, {111: "acc_peak_x", 112: "acc_peak_y", 113: "acc_peak_z"},
+                                                   complete_only)
 
     return data_acc_peak_xyz
 
-def retrieve_all_battery_data(db_file, table_name = 'longEventData'):
+@ediary2_profiling.profiled
+def retrieve_all_battery_data(db_file, table_name = 'longEventData', run_id=None, start=None, end=None):
     """Retrieve battery level (0-100) from .db file and returns pd.DataFrame"""
 
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {999}')
-    
-    # Fetch all rows from the table
-    data_battery = cursor.fetchall()
-    
-    # Close the connection
-    conn.close()
-
-    df_battery = pd.DataFrame(data_battery, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "battery"])
-
-    return df_battery
\ No newline at end of file
+    df_battery = _retrieve_event_rows(db_file, table_name, 2, [999],
+                 ["original_idx", "runID", "timestamp", "platformID", "sensorID", "battery"],
+                 run_id, start, end)
+
+    return df_battery
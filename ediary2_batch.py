@@ -0,0 +1,163 @@
+"""Summarize many eDiary databases from the command line, in parallel
+
+    python ediary2_batch.py data/2024-05/ -o summaries/ --format parquet
+"""
+
+import argparse
+import glob
+import os
+import time
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import ediary2_helpers
+
+# Sensors summarized (and exported) unless --sensors is given: the ones charted by the app
+DEFAULT_SENSORS = ["BWA", "posture", "heart_rate", "resp_rate", "ecg_ampl", "ecg_noise"]
+
+def find_databases(inputs):
+    """Expand files, directories (searched recursively) and glob patterns to sorted .db paths"""
+
+    found = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            found.update(glob.glob(os.path.join(item, "**", "*.db"), recursive=True))
+        else:
+            found.update(path for path in glob.glob(item) if os.path.isfile(path))
+
+    return sorted(found)
+
+def database_names(db_files):
+    """Name of every database relative to the common root of all inputs (p1/ediary.db, p2/ediary.db) --> returns dict"""
+
+    if not db_files:
+        return {}
+
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(db_file)) for db_file in db_files])
+    return {db_file: os.path.relpath(os.path.abspath(db_file), root).replace(os.sep, "/") for db_file in db_files}
+
+def summarize_runs(db_file, sensors = DEFAULT_SENSORS, export_dir = None, file_format = "parquet", name = None):
+    """Record counts and sampling frequencies of every run of one database and returns pd.DataFrame
+
+    name identifies the database in the file column and the exports (default: its file name, see
+    database_names). With export_dir the location, feedback and sensor frames are also written
+    to <export_dir>/<stream>/<name without .db>.<format>.
+    """
+
+    name = name or os.path.basename(db_file)
+
+    runs = ediary2_helpers.retrieve_run_data(db_file)
+    streams = {"location": ediary2_helpers.retrieve_location_data(db_file),
+               "feedback": ediary2_helpers.retrieve_feedback_data(db_file)}
+    streams.update(ediary2_helpers.retrieve_all_sensors_data(db_file, sensors=sensors))
+
+    summary = runs[["id", "name", "study", "timestamp_start_utc", "timestamp_end_utc"]].rename(columns={"id": "runID"})
+    summary.insert(0, "file", name)
+    summary["duration_s"] = (summary["timestamp_end_utc"] - summary["timestamp_start_utc"]).dt.total_seconds()
+
+    for stream, frame in streams.items():
+        counts = frame.groupby("runID").size()
+        summary[f"{stream}_recordings"] = summary["runID"].map(counts).fillna(0).astype("int64")
+        if stream in sensors:
+            summary[f"{stream}_hz"] = summary[f"{stream}_recordings"] / summary["duration_s"].where(summary["duration_s"] > 0)
+
+        if export_dir is not None:
+            # Databases in subdirectories keep them, so equal file names do not overwrite each other
+            path = os.path.join(export_dir, stream, *os.path.splitext(name)[0].split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_table(frame.assign(file=name), path, file_format)
+
+    return summary
+
+def process_database(db_file, sensors = DEFAULT_SENSORS, export_dir = None, file_format = "parquet", name = None):
+    """Worker: summarize one database, timing it and catching its errors --> returns (pd.DataFrame or None, dict)"""
+
+    name = name or os.path.basename(db_file)
+    started = time.perf_counter()
+    try:
+        summary = summarize_runs(db_file, sensors, export_dir, file_format, name)
+        error = None
+    except Exception as e:
+        summary = None
+        error = f"{type(e).__name__}: {e}"
+
+    timing = {"file": name, "path": db_file, "size_bytes": os.path.getsize(db_file),
+              "runs": 0 if summary is None else len(summary), "seconds": time.perf_counter() - started,
+              "error": error}
+
+    return summary, timing
+
+def write_table(df, path_without_extension, file_format = "parquet"):
+    """Write a frame as Parquet or CSV and return the path written"""
+
+    path = f"{path_without_extension}.{file_format}"
+    if file_format == "parquet":
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+
+    return path
+
+def run_batch(db_files, output_dir, sensors = DEFAULT_SENSORS, workers = None, file_format = "parquet",
+              export_streams = False, progress = print):
+    """Summarize databases across a process pool and write runs.<format> and timings.<format> --> returns (pd.DataFrame, pd.DataFrame)"""
+
+    os.makedirs(output_dir, exist_ok=True)
+    export_dir = os.path.join(output_dir, "streams") if export_streams else None
+
+    names = database_names(db_files)
+    summaries, timings = [], []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(process_database, db_file, sensors, export_dir, file_format, names[db_file])
+                   for db_file in db_files]
+        for done, future in enumerate(as_completed(futures), start=1):
+            summary, timing = future.result()
+            if summary is not None:
+                summaries.append(summary)
+            timings.append(timing)
+            progress(f"[{done}/{len(futures)}] {timing['file']}: {timing['seconds']:.2f} s"
+                     + (f" FAILED ({timing['error']})" if timing["error"] else ""))
+
+    runs = pd.concat(summaries, ignore_index=True) if summaries else pd.DataFrame()
+    timings = pd.DataFrame(timings, columns=["file", "path", "size_bytes", "runs", "seconds", "error"])
+
+    write_table(runs, os.path.join(output_dir, "runs"), file_format)
+    write_table(timings.sort_values("file"), os.path.join(output_dir, "timings"), file_format)
+
+    return runs, timings
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(description="Summarize eDiary 2.0 databases (record counts, sampling "
+                                                 "frequencies, run durations) in parallel.")
+    parser.add_argument("inputs", nargs="+", help=".db files, directories (searched recursively) or glob patterns")
+    parser.add_argument("-o", "--output-dir", default="ediary2_batch_output", help="directory for the consolidated outputs")
+    parser.add_argument("-f", "--format", choices=["parquet", "csv"], default="parquet", help="output file format")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(), help="worker processes (default: CPU count)")
+    parser.add_argument("--sensors", nargs="+", default=DEFAULT_SENSORS,
+                        choices=list(ediary2_helpers.BIOHARNESS_SENSORS) + list(ediary2_helpers.ACC_AXES),
+                        help="BioHarness sensors to summarize")
+    parser.add_argument("--export-streams", action="store_true",
+                        help="also write the location, feedback and sensor data of every database")
+
+    return parser.parse_args(argv)
+
+def main(argv = None):
+    args = parse_args(argv)
+
+    db_files = find_databases(args.inputs)
+    if not db_files:
+        raise SystemExit("No .db files found")
+
+    started = time.perf_counter()
+    runs, timings = run_batch(db_files, args.output_dir, args.sensors, args.workers, args.format, args.export_streams)
+
+    failed = timings["error"].notna().sum()
+    print(f"{len(db_files)} databases ({failed} failed), {len(runs)} runs in {time.perf_counter() - started:.1f} s"
+          f" --> {args.output_dir}")
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
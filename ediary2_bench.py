@@ -0,0 +1,149 @@
+"""Time the loaders, the map builder and the chart preparation on synthetic databases
+
+    python ediary2_bench.py --scales 1h 1d --repeat 3 --output bench_output.txt
+"""
+
+import argparse
+import inspect
+import os
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows: the max RSS line is left out there
+    resource = None
+
+import ediary2_helpers
+import ediary2_db
+import ediary2_geo
+import ediary2_plotting
+import ediary2_quality
+import ediary2_resample
+import ediary2_synthetic
+
+# Run duration per benchmark scale
+SCALES = {"1h": 3600, "1d": 86_400, "1w": 604_800}
+
+RESULT_COLUMNS = ["scale", "benchmark", "rows", "best_s", "mean_s", "peak_mb"]
+
+def _rows(result):
+    """Number of rows of a loader / benchmark result"""
+
+    if isinstance(result, pd.DataFrame):
+        return len(result)
+    if isinstance(result, dict):
+        return sum(_rows(value) for value in result.values())
+    return None
+
+def loader_benchmarks(db_file):
+    """Every retrieve_* function of ediary2_helpers, called on the whole database --> returns dict of name -> callable"""
+
+    loaders = {name: function for name, function in vars(ediary2_helpers).items()
+               if name.startswith("retrieve_") and inspect.isfunction(function)}
+    return {name: (lambda loader=loader: loader(db_file)) for name, loader in sorted(loaders.items())}
+
+def view_benchmarks(db_file):
+    """Map, chart and analysis preparation of the first run, as the app does it --> returns dict of name -> callable"""
+
+    run_id = int(ediary2_helpers.retrieve_run_ids(db_file)[0])
+    location = ediary2_helpers.retrieve_location_data(db_file, run_id=run_id)
+    sensors = [sensor for sensor, _, _ in ediary2_plotting.DASHBOARD_CHANNELS]
+    sensor_data = ediary2_helpers.retrieve_all_sensors_data(db_file, sensors=sensors, run_id=run_id)
+
+    return {
+        "track_levels": lambda: ediary2_geo.track_levels(location),
+        "map_html": lambda: ediary2_plotting.create_map_with_track_and_MOS(location).get_root().render(),
+        "dashboard_json": lambda: ediary2_plotting.sensor_dashboard(sensor_data).to_json(),
+        "quality_report": lambda: ediary2_quality.quality_report(sensor_data),
+        "resample_1s": lambda: ediary2_resample.resample_run({**sensor_data, "location": location}, "1s",
+                                                             columns={"location": ["latitude", "longitude", "speed"]}),
+    }
+
+def time_benchmark(function, repeat = 3):
+    """Best and mean wall time over repeat calls plus the peak traced memory of one extra call --> returns dict"""
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+
+    # Memory is traced in a separate call: tracemalloc slows the code down
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {"rows": _rows(result), "best_s": min(timings), "mean_s": sum(timings) / len(timings),
+            "peak_mb": peak / 2**20}
+
+def synthetic_database(scale, participants = 1, data_dir = None):
+    """Path of the synthetic database of a scale, generated on first use"""
+
+    data_dir = data_dir or os.path.join(tempfile.gettempdir(), "ediary2_bench")
+    os.makedirs(data_dir, exist_ok=True)
+
+    path = os.path.join(data_dir, f"synthetic_{scale}_{participants}p.db")
+    if not os.path.exists(path):
+        ediary2_synthetic.generate_database(path + ".part", participants, SCALES[scale])
+        os.replace(path + ".part", path)
+
+    return path
+
+def run_benchmarks(scales = ("1h", "1d"), repeat = 3, participants = 1, data_dir = None, only = None, progress = print):
+    """Run every benchmark at every scale and returns pd.DataFrame of RESULT_COLUMNS"""
+
+    results = []
+    for scale in scales:
+        started = time.perf_counter()
+        db_file = synthetic_database(scale, participants, data_dir)
+        progress(f"{scale}: {db_file} ({os.path.getsize(db_file) / 2**20:.0f} MB, ready in {time.perf_counter() - started:.1f} s)")
+
+        benchmarks = {**loader_benchmarks(db_file), **view_benchmarks(db_file)}
+        for name, function in benchmarks.items():
+            if only and not any(pattern in name for pattern in only):
+                continue
+            result = {"scale": scale, "benchmark": name, **time_benchmark(function, repeat)}
+            results.append(result)
+            progress(f"  {name:<40} {result['best_s']:9.3f} s  {result['peak_mb']:9.1f} MB")
+
+        ediary2_db.close_connections()
+
+    return pd.DataFrame(results, columns=RESULT_COLUMNS)
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(description="Benchmark the eDiary loaders, map and charts on synthetic databases.")
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=["1h", "1d"], help="run durations to benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="timed calls per benchmark")
+    parser.add_argument("--participants", type=int, default=1, help="runs per synthetic database")
+    parser.add_argument("--data-dir", default=None, help="where synthetic databases are kept (default: temp directory)")
+    parser.add_argument("--only", nargs="+", default=None, help="only run benchmarks whose name contains one of these")
+    parser.add_argument("--output", default="bench_output.txt", help="results table (text)")
+    parser.add_argument("--csv", default=None, help="also write the results as CSV")
+
+    return parser.parse_args(argv)
+
+def main(argv = None):
+    args = parse_args(argv)
+
+    results = run_benchmarks(args.scales, args.repeat, args.participants, args.data_dir, args.only)
+
+    report = results.to_string(index=False, float_format=lambda value: f"{value:.3f}")
+    if resource is not None:
+        # ru_maxrss is in KB on Linux
+        report += f"\n\nmax RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB"
+
+    with open(args.output, "w") as f:
+        f.write(report + "\n")
+    if args.csv:
+        results.to_csv(args.csv, index=False)
+
+    print(f"\n{report}\n--> {args.output}")
+
+if __name__ == "__main__":
+    main()
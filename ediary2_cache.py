@@ -0,0 +1,156 @@
+import hashlib
+import os
+import sys
+import threading
+
+from collections import OrderedDict
+
+import pandas as pd
+
+import ediary2_profiling
+
+### Result cache for the eDiary loaders across Streamlit reruns
+
+# Memory budget of the shared cache, configurable through the environment
+DEFAULT_MAX_BYTES = int(os.environ.get("EDIARY2_CACHE_MB", "1024")) * 2**20
+
+# (resolved path, mtime_ns, size) -> content hash, so each file version is hashed only once
+_file_hashes = {}
+_file_hashes_lock = threading.Lock()
+
+def _directory_hash(path):
+    """SHA-256 of a directory listing (relative paths, sizes, mtimes), e.g. of a Parquet snapshot"""
+
+    listing = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            stat = os.stat(file_path)
+            listing.update(f"{os.path.relpath(file_path, path)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+
+    return listing.hexdigest()
+
+def file_hash(db_file):
+    """SHA-256 of a .db file's content, computed once per file version --> returns str"""
+
+    path = os.path.abspath(db_file)
+    if os.path.isdir(path):
+        return _directory_hash(path)
+
+    stat = os.stat(path)
+    version = (path, stat.st_mtime_ns, stat.st_size)
+
+    with _file_hashes_lock:
+        digest = _file_hashes.get(version)
+    if digest is not None:
+        return digest
+
+    with open(path, "rb") as f:
+        digest = hashlib.file_digest(f, "sha256").hexdigest()
+
+    with _file_hashes_lock:
+        _file_hashes[version] = digest
+
+    return digest
+
+def remember_file_hash(db_file, digest):
+    """Record an already known content hash of a .db file (e.g. computed on upload) so it is not hashed again"""
+
+    path = os.path.abspath(db_file)
+    stat = os.stat(path)
+
+    with _file_hashes_lock:
+        _file_hashes[(path, stat.st_mtime_ns, stat.st_size)] = digest
+
+def _freeze(value):
+    """Turn loader arguments into something hashable (lists of sensors, dicts, ...)"""
+
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+def _sizeof(value):
+    """Approximate memory footprint of a loader result in bytes"""
+
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, dict):
+        return sum(_sizeof(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_sizeof(item) for item in value)
+    return sys.getsizeof(value)
+
+class ResultCache:
+    """LRU cache of loader results keyed on the database content hash plus loader name and arguments
+
+    Results are shared between reruns (and sessions uploading the same file), so
+    callers must treat them as read-only and copy before modifying.
+    """
+
+    def __init__(self, max_bytes = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_or_load(self, loader, db_file, *args, **kwargs):
+        """Return loader(db_file, *args, **kwargs), loading it only on a cache miss"""
+
+        key = (file_hash(db_file), loader.__module__, loader.__qualname__, _freeze(args), _freeze(kwargs))
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+
+        result = loader(db_file, *args, **kwargs)
+        size = _sizeof(result)
+
+        with self._lock:
+            # Results larger than the whole budget are returned but never kept
+            if size <= self.max_bytes and key not in self._entries:
+                self._entries[key] = (result, size)
+                self.current_bytes += size
+                self._evict()
+
+        return result
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits its memory budget"""
+
+        while self.current_bytes > self.max_bytes and self._entries:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.current_bytes -= size
+
+    def resize(self, max_bytes):
+        """Change the memory budget, evicting entries if needed"""
+
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+RESULT_CACHE = ResultCache()
+
+def cached(loader, db_file, *args, **kwargs):
+    """Call a loader through the shared RESULT_CACHE"""
+
+    # Timed as one stage, so cache hits show up in the performance panel as well
+    with ediary2_profiling.stage(f"cached {loader.__name__}", kind="cache"):
+        return RESULT_CACHE.get_or_load(loader, db_file, *args, **kwargs)
@@ -0,0 +1,138 @@
+import os
+import threading
+
+import pandas as pd
+
+import ediary2_db
+import ediary2_profiling
+
+### Schema catalog of an eDiary database, built once per file version
+
+# Columns identifying an event table (one aggregate pass per such table), lowercase: SQLite names are case-insensitive
+EVENT_KEY_COLUMNS = {"runid", "timestamp", "platformid", "sensorid"}
+
+CATALOG_COLUMNS = ["table", "column", "type", "notnull", "default", "pk"]
+TABLE_COLUMNS = ["table", "rows", "event_table"]
+SENSOR_COLUMNS = ["table", "platformID", "sensorID", "runID", "rows", "first_timestamp", "last_timestamp",
+                  "first_utc", "last_utc"]
+
+def _sorts_in_temp_btree(cursor, query):
+    """True if SQLite would run query through a temporary b-tree (a sort of every row, e.g. an unindexed GROUP BY)"""
+
+    cursor.execute(f"EXPLAIN QUERY PLAN {query}")
+
+    return any("TEMP B-TREE" in row[-1] for row in cursor.fetchall())
+
+def _aggregate_event_table(db_file, cursor, table_name):
+    """Rows and first / last timestamp per (platformId, sensorId, runId) of an event table --> returns list of tuples
+
+    With an index on (platformId, sensorId, runId, ...) the GROUP BY streams the groups on the
+    shared connection. Without it SQLite sorts every row of the table in a temporary b-tree,
+    which the shared connections keep in memory (temp_store = MEMORY): that sort runs on a separate
+    connection with temp_store = FILE, so it spills to disk instead of growing with the table.
+    """
+
+    query = (f'SELECT platformId, sensorId, runId, COUNT(*), MIN(timestamp), MAX(timestamp) '
+             f'FROM {table_name} GROUP BY platformId, sensorId, runId')
+    if not _sorts_in_temp_btree(cursor, query):
+        cursor.execute(query)
+        return cursor.fetchall()
+
+    conn = ediary2_db.open_readonly(db_file)
+    try:
+        conn.execute("PRAGMA temp_store = FILE;")
+        return conn.execute(query).fetchall()
+    finally:
+        conn.close()
+
+@ediary2_profiling.profiled
+def build_catalog(db_file):
+    """Tables, columns, row counts and recorded platform / sensor combinations of a .db file --> returns dict of pd.DataFrame
+
+    "columns": one row per table column (PRAGMA table_info)
+    "tables": row count per table
+    "sensors": rows and first / last timestamp per (table, platformID, sensorID, runID) of every event table
+
+    Event tables are read with a single GROUP BY pass each (an index scan when create_event_indexes
+    was run, otherwise a sort spilled to disk, see _aggregate_event_table); their row counts are
+    the sums of those groups.
+    """
+
+    columns, tables, sensors = [], [], []
+
+    # Borrow a cursor on the shared read-only connection
+    with ediary2_db.read_cursor(db_file) as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name;")
+        table_names = [row[0] for row in cursor.fetchall()]
+
+        for table_name in table_names:
+            cursor.execute(f"PRAGMA table_info({table_name});")
+            info = cursor.fetchall()
+            columns.extend((table_name, name, col_type, bool(notnull), default, pk) for _, name, col_type, notnull, default, pk in info)
+
+            if EVENT_KEY_COLUMNS <= {row[1].lower() for row in info}:
+                groups = _aggregate_event_table(db_file, cursor, table_name)
+                sensors.extend((table_name, *group) for group in groups)
+                tables.append((table_name, sum(group[3] for group in groups), True))
+            else:
+                cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+                tables.append((table_name, cursor.fetchone()[0], False))
+
+    sensors = pd.DataFrame(sensors, columns=SENSOR_COLUMNS[:-2])
+    sensors["first_utc"] = pd.to_datetime(sensors["first_timestamp"], unit="ms", utc=True)
+    sensors["last_utc"] = pd.to_datetime(sensors["last_timestamp"], unit="ms", utc=True)
+
+    return {"columns": pd.DataFrame(columns, columns=CATALOG_COLUMNS),
+            "tables": pd.DataFrame(tables, columns=TABLE_COLUMNS),
+            "sensors": sensors}
+
+# (resolved path, mtime_ns, size) -> catalog: kept apart from the evictable result cache, since
+# every sensor loader call looks the catalog up
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+def get_catalog(db_file):
+    """Catalog of a .db file, built once per file version (see build_catalog)"""
+
+    path = os.path.abspath(db_file)
+    stat = os.stat(path)
+    version = (path, stat.st_mtime_ns, stat.st_size)
+
+    with _catalogs_lock:
+        catalog = _catalogs.get(version)
+    if catalog is not None:
+        return catalog
+
+    catalog = build_catalog(db_file)
+    with _catalogs_lock:
+        _catalogs[version] = catalog
+
+    return catalog
+
+def sensor_counts(db_file, table_name, platform_id, run_id=None):
+    """Recorded rows per sensorId of one platform in an event table (optionally of one run) --> returns dict
+
+    Returns None when the catalog does not know the table as an event table, i.e. the
+    counts are unknown (not zero) and the table has to be queried.
+    """
+
+    catalog = get_catalog(db_file)
+    tables = catalog["tables"]
+    event_tables = set(tables.loc[tables["event_table"], "table"].str.lower())
+    if table_name.lower() not in event_tables:
+        return None
+
+    sensors = catalog["sensors"]
+    selected = sensors[(sensors["table"].str.lower() == table_name.lower()) & (sensors["platformID"] == platform_id)]
+    if run_id is not None:
+        selected = selected[selected["runID"] == int(run_id)]
+
+    return selected.groupby("sensorID")["rows"].sum().to_dict()
+
+def sensor_overview(db_file):
+    """Rows, runs and time range per (table, platformID, sensorID) over all runs and returns pd.DataFrame"""
+
+    return (get_catalog(db_file)["sensors"]
+            .groupby(["table", "platformID", "sensorID"])
+            .agg(rows=("rows", "sum"), runs=("runID", "nunique"), first_utc=("first_utc", "min"), last_utc=("last_utc", "max"))
+            .reset_index())
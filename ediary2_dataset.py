@@ -0,0 +1,115 @@
+from functools import cached_property
+
+import ediary2_helpers
+import ediary2_cache
+import ediary2_geo
+
+### Lazy access to the streams of one eDiary database (or Parquet snapshot)
+
+def _load_track_levels(db_file, run_id=None):
+    """Retrieve a run's locations and simplify them at every ediary2_geo.DETAIL_LEVELS_M tolerance"""
+    location = ediary2_cache.cached(ediary2_helpers.retrieve_location_data, db_file, run_id=run_id)
+    return ediary2_geo.track_levels(location)
+
+def _load_location_index(db_file, run_id=None):
+    """Retrieve a run's locations and index them in space and time (see ediary2_geo.LocationIndex)"""
+    location = ediary2_cache.cached(ediary2_helpers.retrieve_location_data, db_file, run_id=run_id)
+    return ediary2_geo.LocationIndex(location)
+
+# (run column, time column) of the streams that are not sensor frames
+RUN_COLUMNS = {"run_data": ("id", "start")}
+
+def _load_run_index(db_file, stream):
+    """Read a stream of all runs and index it by run (see ediary2_helpers.index_runs)"""
+    frame = EDiaryDataset(db_file).stream(stream)
+    return ediary2_helpers.index_runs(frame, *RUN_COLUMNS.get(stream, ("runID", "timestamp")))
+
+def _sensor_stream(name):
+    """Memoized property reading one BioHarness sensor of the run on first access"""
+    return cached_property(lambda self: self.sensors([name])[name])
+
+class EDiaryDataset:
+    """Streams of one database, optionally restricted to one run, read on first access
+
+    Nothing is read when the object is created. Each property loads its stream the first time
+    it is accessed (through ediary2_cache, so reruns with an unchanged file hit the result cache)
+    and keeps it for the lifetime of the object. With compact=True sensor frames are read with
+    compact dtypes (see ediary2_helpers.compact_frame).
+    """
+
+    def __init__(self, db_file, run_id=None, compact=False):
+        self.db_file = db_file
+        self.run_id = run_id
+        self.compact = compact
+        self._sensors = {}
+        self._run_indexes = {}
+
+    @cached_property
+    def run_data(self):
+        return ediary2_cache.cached(ediary2_helpers.retrieve_run_data, self.db_file, run_id=self.run_id)
+
+    @cached_property
+    def run_ids(self):
+        return ediary2_cache.cached(ediary2_helpers.retrieve_run_ids, self.db_file)
+
+    @cached_property
+    def location(self):
+        return ediary2_cache.cached(ediary2_helpers.retrieve_location_data, self.db_file, run_id=self.run_id)
+
+    @cached_property
+    def feedback(self):
+        return ediary2_cache.cached(ediary2_helpers.retrieve_feedback_data, self.db_file, run_id=self.run_id)
+
+    @cached_property
+    def track_levels(self):
+        return ediary2_cache.cached(_load_track_levels, self.db_file, run_id=self.run_id)
+
+    @cached_property
+    def location_index(self):
+        return ediary2_cache.cached(_load_location_index, self.db_file, run_id=self.run_id)
+
+    def sensors(self, names, start=None, end=None):
+        """BioHarness sensors by name (see ediary2_helpers.BIOHARNESS_SENSORS) --> returns dict of pd.DataFrame
+
+        Sensors not read yet for this time window are loaded together, one scan per event table.
+        """
+
+        loaded = self._sensors.setdefault((start, end), {})
+        missing = [name for name in names if name not in loaded]
+        if missing:
+            loaded.update(ediary2_cache.cached(ediary2_helpers.retrieve_all_sensors_data, self.db_file,
+                                               sensors=missing, run_id=self.run_id, start=start, end=end,
+                                               compact=self.compact))
+
+        return {name: loaded[name] for name in names}
+
+    def stream(self, name):
+        """A stream by name: "run_data", "location", "feedback" or a BioHarness sensor --> returns pd.DataFrame"""
+
+        if name in ("run_data", "location", "feedback"):
+            return getattr(self, name)
+        return self.sensors([name])[name]
+
+    def run_frame(self, name, run_id):
+        """Rows of one run of a stream, sliced from a per-run index built once per database --> returns pd.DataFrame"""
+
+        if name not in self._run_indexes:
+            if self.run_id is None:
+                self._run_indexes[name] = ediary2_cache.cached(_load_run_index, self.db_file, name)
+            else:
+                self._run_indexes[name] = ediary2_helpers.index_runs(self.stream(name), *RUN_COLUMNS.get(name, ("runID", "timestamp")))
+
+        return ediary2_helpers.run_slice(*self._run_indexes[name], run_id)
+
+    breathing_wave_amplitude = _sensor_stream("BWA")
+    posture = _sensor_stream("posture")
+    heart_rate = _sensor_stream("heart_rate")
+    resp_rate = _sensor_stream("resp_rate")
+    ecg_amplitude = _sensor_stream("ecg_ampl")
+    ecg_noise = _sensor_stream("ecg_noise")
+    worn_status = _sensor_stream("worn_status")
+    color_status = _sensor_stream("color")
+    battery_status = _sensor_stream("battery")
+    vector_mag = _sensor_stream("vector_mag_u")
+    acc_min = _sensor_stream("acc_min")
+    acc_peak = _sensor_stream("acc_peak")
@@ -0,0 +1,195 @@
+import sqlite3
+import hashlib
+import os
+import shutil
+import tempfile
+import pathlib
+import threading
+import time
+
+from contextlib import contextmanager
+
+### Shared read-only connections to eDiary .db files
+
+# Pragmas for the read-only connections: memory-map the file, a 64 MB page cache
+# and temporary b-trees (sorting, DISTINCT, GROUP BY) in memory
+MMAP_SIZE = 256 * 2**20
+CACHE_SIZE_KB = 64 * 1024
+
+# Uploaded databases are stored here once per content hash, outside the application directory
+UPLOAD_DIR = os.environ.get("EDIARY2_UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "ediary2"))
+
+# Stored uploads (with their indexed copies and Parquet snapshots) older than this are removed on ingest
+UPLOAD_MAX_AGE_S = float(os.environ.get("EDIARY2_UPLOAD_MAX_AGE_H", "24")) * 3600
+
+# resolved path -> ((mtime_ns, size), sqlite3.Connection)
+_connections = {}
+_connections_lock = threading.Lock()
+
+def is_owned(db_file):
+    """True for files the app wrote itself (ingest_upload / derived_copy in UPLOAD_DIR) and never modifies
+
+    Only those are opened immutable: for any other file SQLite has to read the -wal file
+    that a phone database in WAL mode may still have its latest changes in.
+    """
+
+    path = os.path.realpath(db_file)
+    directory = os.path.realpath(UPLOAD_DIR)
+
+    return path.startswith(directory + os.sep) and not os.path.exists(path + "-wal")
+
+def open_readonly(db_file):
+    """Open a .db file in read-only URI mode (immutable for owned files) with tuned pragmas and returns sqlite3.Connection"""
+
+    uri = pathlib.Path(db_file).resolve().as_uri() + "?mode=ro"
+    if is_owned(db_file):
+        uri += "&immutable=1"
+
+    # Streamlit reruns the script in different threads; sqlite3 serializes access to the connection
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE};")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB};")
+    conn.execute("PRAGMA temp_store = MEMORY;")
+
+    return conn
+
+def get_connection(db_file):
+    """Return the shared read-only connection of a .db file, opening it on first use
+
+    immutable=1 (owned files) makes SQLite skip locking and change detection, so the
+    connection is keyed on the file's mtime and size as well: a rewritten file (new upload,
+    new indexes) gets a fresh connection while the old one is released once unused.
+    """
+
+    path = os.path.abspath(db_file)
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+
+    with _connections_lock:
+        cached = _connections.get(path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        conn = open_readonly(path)
+        _connections[path] = (version, conn)
+
+    return conn
+
+@contextmanager
+def read_cursor(db_file):
+    """Hand out a cursor on the shared read-only connection of a .db file"""
+
+    cursor = get_connection(db_file).cursor()
+    try:
+        yield cursor
+    finally:
+        cursor.close()
+
+def close_connections():
+    """Close all shared connections (e.g. before deleting the .db files)"""
+
+    with _connections_lock:
+        for _, conn in _connections.values():
+            conn.close()
+        _connections.clear()
+
+### Ingestion of uploaded databases
+
+def ingest_upload(data, directory=UPLOAD_DIR):
+    """Store uploaded .db bytes as <directory>/<sha256>.db unless already there --> returns (path, sha256)
+
+    Re-uploads of the same content (by any session, under any file name) reuse the stored
+    file, and concurrent uploads never write to the same path at the same time. Every ingest
+    first sweeps the entries unused for UPLOAD_MAX_AGE_S (EDIARY2_UPLOAD_MAX_AGE_H) from directory.
+    """
+
+    digest = hashlib.sha256(data).hexdigest()
+    path = os.path.join(directory, digest + ".db")
+
+    sweep_uploads(directory, keep=digest)
+
+    try:
+        _mark_used(path)
+    except FileNotFoundError:
+        os.makedirs(directory, exist_ok=True)
+
+        # Write to a temporary file in the same directory and rename, so readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".db.part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    return path, digest
+
+def _mark_used(path):
+    """Set the access time of a stored file to now (its mtime, part of the connection and catalog keys, is kept)"""
+
+    stat = os.stat(path)
+    os.utime(path, ns=(time.time_ns(), stat.st_mtime_ns))
+
+def sweep_uploads(directory=UPLOAD_DIR, max_age_s=UPLOAD_MAX_AGE_S, keep=None):
+    """Remove the entries of the upload directory not stored or reused for max_age_s seconds --> returns list of removed paths
+
+    Stored files are never modified: their mtime is the time they were stored and ingest_upload /
+    derived_copy set their access time when they are reused. Entries whose name starts with keep
+    (the digest being ingested) are left alone. Sessions still using a removed file store their
+    upload again (see save_uploadedfile in main_app.py), and its shared connection is dropped so
+    the file's disk space is released once the connection is unused.
+    """
+
+    if not os.path.isdir(directory):
+        return []
+
+    cutoff = time.time() - max_age_s
+    removed = []
+    for entry in os.scandir(directory):
+        if keep is not None and entry.name.startswith(keep):
+            continue
+        try:
+            stat = entry.stat(follow_symlinks=False)
+            if max(stat.st_mtime, stat.st_atime) >= cutoff:
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            # Removed by a concurrent sweep of another session
+            continue
+        removed.append(entry.path)
+
+    with _connections_lock:
+        for path in removed:
+            _connections.pop(os.path.abspath(path), None)
+
+    return removed
+
+def derived_copy(db_file, suffix, build):
+    """Copy of db_file modified in place by build(path) once, e.g. an indexed variant --> returns (path, built)
+
+    The copy is stored next to db_file as <name>-<suffix>.db; built is False when it already existed.
+    """
+
+    path = os.path.splitext(db_file)[0] + f"-{suffix}.db"
+    try:
+        _mark_used(path)
+        return path, False
+    except FileNotFoundError:
+        pass
+
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".db.part")
+    os.close(fd)
+    try:
+        shutil.copyfile(db_file, tmp)
+        build(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+    return path, True
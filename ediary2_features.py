@@ -0,0 +1,165 @@
+import numpy as np
+import pandas as pd
+
+import ediary2_helpers
+import ediary2_profiling
+
+### Physiological features in time windows around each feedback (survey) event
+
+# feature name -> BioHarness value column it is computed from
+FEATURE_SENSORS = {
+    "heart_rate": "heart_rate",
+    "resp_rate": "resp_rate",
+    "BWA": "BWA",
+    "posture": "posture",
+    "activity": "vector_mag_u",
+}
+
+# (window name, start, end) in seconds relative to the feedback timestamp, half-open [start, end)
+DEFAULT_WINDOWS = [("before", -300, 0), ("after", 0, 300)]
+
+WINDOW_AGGREGATIONS = ["mean", "std", "min", "max", "count"]
+
+# Feedback columns carried over into the feature table
+EVENT_COLUMNS = ["original_idx", "runID", "timestamp", "feelingDescription", "causeDescription", "intensity"]
+
+def _sorted_stream(df, value_column):
+    """Run ids, timestamps and values of a sensor frame sorted by (runID, timestamp), NaN values dropped"""
+
+    runs = df["runID"].to_numpy(dtype=np.int64)
+    timestamps = df["timestamp"].to_numpy(dtype=np.int64)
+    values = df[value_column].to_numpy(dtype=float)
+
+    keep = ~np.isnan(values)
+    runs, timestamps, values = runs[keep], timestamps[keep], values[keep]
+
+    # Loaded frames are usually already in order: only sort when they are not
+    if len(runs) > 1 and ((np.diff(runs) < 0) | ((np.diff(runs) == 0) & (np.diff(timestamps) < 0))).any():
+        order = np.lexsort((timestamps, runs))
+        runs, timestamps, values = runs[order], timestamps[order], values[order]
+
+    return runs, timestamps, values
+
+def window_bounds(sample_runs, sample_times, event_runs, event_times, start_ms, end_ms):
+    """First / past-the-end sample index of the window [event + start_ms, event + end_ms) of every event
+
+    The samples must be sorted by (run, time). Run and time are folded into one monotonic int64 key
+    (run rank x key span + time offset), so a single np.searchsorted per bound handles all events of
+    all runs at once; events of runs without samples get an empty window.
+    """
+
+    event_runs = np.asarray(event_runs, dtype=np.int64)
+    event_times = np.asarray(event_times, dtype=np.int64)
+    if len(sample_times) == 0 or len(event_times) == 0:
+        empty = np.zeros(len(event_times), dtype=np.int64)
+        return empty, empty.copy()
+
+    # Sorted samples: the distinct runs are where the run id changes
+    unique_runs = sample_runs[np.flatnonzero(np.diff(sample_runs, prepend=sample_runs[0] - 1))]
+    origin = min(sample_times.min(), event_times.min())
+    # Padding keeps every window bound inside its own run's block of keys
+    pad = max(abs(start_ms), abs(end_ms))
+    span = max(sample_times.max(), event_times.max()) - origin + 2 * pad + 1
+
+    sample_keys = np.searchsorted(unique_runs, sample_runs) * span + (sample_times - origin + pad)
+
+    rank = np.searchsorted(unique_runs, event_runs)
+    known = (rank < len(unique_runs)) & (unique_runs[np.minimum(rank, len(unique_runs) - 1)] == event_runs)
+    event_keys = rank * span + (event_times - origin + pad)
+
+    lo = np.searchsorted(sample_keys, event_keys + start_ms, side="left")
+    hi = np.searchsorted(sample_keys, event_keys + end_ms, side="left")
+    lo[~known] = hi[~known] = 0
+
+    return lo, hi
+
+def window_aggregates(values, lo, hi, aggregations = WINDOW_AGGREGATIONS):
+    """Aggregates of values[lo:hi] for every window, from cumulative sums and reduceat --> returns dict of np.ndarray
+
+    mean / std (ddof=1) / count come from prefix sums of the (centered) values and their squares;
+    min / max use ufunc.reduceat on the interleaved (lo, hi) indices, which also handles
+    overlapping windows. Empty windows give NaN (count 0).
+    """
+
+    count = hi - lo
+    non_empty = count > 0
+    out = {}
+
+    for name, ufunc in (("min", np.minimum), ("max", np.maximum)):
+        if name not in aggregations and "std" not in aggregations:
+            continue
+        result = np.full(len(lo), np.nan)
+        if non_empty.any():
+            # reduceat over [lo, hi) pairs: the reduction of each pair lands at the even positions. Windows
+            # are ordered by lo so the odd (in-between) reductions cover every sample at most once
+            windows = np.flatnonzero(non_empty)
+            windows = windows[np.argsort(lo[windows], kind="stable")]
+            padded = np.append(values, np.nan)
+            indices = np.column_stack([lo[windows], hi[windows]]).ravel()
+            result[windows] = ufunc.reduceat(padded, indices)[::2]
+        out[name] = result
+
+    if {"mean", "std"} & set(aggregations):
+        # Centering keeps the sum of squares from cancelling out for large, slowly varying values
+        center = values.mean() if len(values) else 0.0
+        centered = values - center
+        sums = np.concatenate([[0.0], np.cumsum(centered)])
+        squares = np.concatenate([[0.0], np.cumsum(centered**2)])
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            window_sum = sums[hi] - sums[lo]
+            mean = np.where(non_empty, window_sum / count, np.nan)
+            variance = (squares[hi] - squares[lo] - window_sum * window_sum / count) / (count - 1)
+        out["mean"] = mean + center
+        if "std" in aggregations:
+            # Prefix sums leave rounding noise in the variance: constant windows (min == max) are exactly 0
+            std = np.sqrt(np.clip(variance, 0, None))
+            out["std"] = np.where(count > 1, np.where(out["min"] == out["max"], 0.0, std), np.nan)
+
+    if "count" in aggregations:
+        out["count"] = count
+
+    return {name: out[name] for name in aggregations}
+
+@ediary2_profiling.profiled
+def feedback_features(feedback, sensor_data, windows = DEFAULT_WINDOWS, features = FEATURE_SENSORS,
+                      aggregations = WINDOW_AGGREGATIONS):
+    """Sensor aggregates in windows around every feedback event and returns pd.DataFrame
+
+    One row per feedback event (EVENT_COLUMNS and timestamp_utc) with a column
+    "<feature>_<window>_<aggregation>" (e.g. heart_rate_before_mean) per combination.
+    Features whose sensor is missing from sensor_data are left out.
+
+    :param feedback: frame of retrieve_feedback_data (any number of runs)
+    :param sensor_data: dict of sensor frames (retrieve_all_sensors_data), covering the same runs
+    :param windows: list of (name, start, end) in seconds relative to the feedback timestamp
+    """
+
+    events = feedback[[column for column in EVENT_COLUMNS if column in feedback.columns]].reset_index(drop=True)
+    events.insert(events.columns.get_loc("timestamp") + 1, "timestamp_utc",
+                  ediary2_helpers.convert_timestamps_to_utc(events["timestamp"]))
+
+    event_runs = events["runID"].to_numpy(dtype=np.int64)
+    event_times = events["timestamp"].to_numpy(dtype=np.int64)
+
+    columns = {}
+    for feature, sensor in features.items():
+        if sensor not in sensor_data:
+            continue
+        runs, timestamps, values = _sorted_stream(sensor_data[sensor], sensor)
+
+        for window, start, end in windows:
+            lo, hi = window_bounds(runs, timestamps, event_runs, event_times, int(start * 1000), int(end * 1000))
+            for aggregation, result in window_aggregates(values, lo, hi, aggregations).items():
+                columns[f"{feature}_{window}_{aggregation}"] = result
+
+    return pd.concat([events, pd.DataFrame(columns, index=events.index)], axis=1)
+
+def database_features(db_file, run_id = None, windows = DEFAULT_WINDOWS, features = FEATURE_SENSORS,
+                      aggregations = WINDOW_AGGREGATIONS):
+    """Feedback features of a database (all runs or one), reading each needed event table once, returns pd.DataFrame"""
+
+    feedback = ediary2_helpers.retrieve_feedback_data(db_file, run_id=run_id)
+    sensor_data = ediary2_helpers.retrieve_all_sensors_data(db_file, sensors=sorted(set(features.values())), run_id=run_id)
+
+    return feedback_features(feedback, sensor_data, windows, features, aggregations)
@@ -0,0 +1,257 @@
+import numpy as np
+import pandas as pd
+
+from scipy.spatial import cKDTree
+
+### GPS track simplification
+
+# Mean Earth radius in metres
+EARTH_RADIUS_M = 6_371_008.8
+
+# Douglas-Peucker tolerances (m) of the precomputed detail levels, finest first
+DETAIL_LEVELS_M = [1, 5, 25]
+
+# Fixes reporting a worse horizontal accuracy (m) than this are dropped before simplifying
+DEFAULT_MAX_ACCURACY_M = 50
+
+# Upper bound on the vertices of a simplified track, whatever the tolerance
+DEFAULT_MAX_VERTICES = 5000
+
+def project_local(latitude, longitude, reference_latitude = None):
+    """Project lat/lon degrees to planar x/y metres (equirectangular around the mean latitude) --> returns (x, y)
+
+    Pass reference_latitude (degrees) to project other points into the same plane, e.g. queries against an index.
+    """
+
+    lat = np.radians(np.asarray(latitude, dtype=float))
+    lon = np.radians(np.asarray(longitude, dtype=float))
+
+    reference = np.radians(reference_latitude) if reference_latitude is not None else (np.nanmean(lat) if len(lat) else 0.0)
+    x = EARTH_RADIUS_M * lon * np.cos(reference) if len(lat) else lon
+    y = EARTH_RADIUS_M * lat
+
+    return x, y
+
+def _segment_distances(x, y, start, stop):
+    """Distance (m) of the points strictly between start and stop to the segment start -> stop"""
+
+    px = x[start + 1:stop] - x[start]
+    py = y[start + 1:stop] - y[start]
+    dx = x[stop] - x[start]
+    dy = y[stop] - y[start]
+
+    length2 = dx * dx + dy * dy
+    if length2 == 0:
+        return np.hypot(px, py)
+
+    # Clamp the projection onto the segment so points beyond its ends measure to the nearest end
+    t = np.clip((px * dx + py * dy) / length2, 0, 1)
+    return np.hypot(px - t * dx, py - t * dy)
+
+def track_significance(x, y, min_tolerance_m = DETAIL_LEVELS_M[0]):
+    """Douglas-Peucker significance of every vertex --> returns np.ndarray of metres
+
+    A vertex is kept by Douglas-Peucker with tolerance tol exactly when its significance is
+    >= tol, so one pass serves every coarser detail level. Significance is capped at that of
+    the vertex which split its segment, which keeps the levels nested. Segments whose
+    deviation stays below min_tolerance_m are not subdivided further (their inner vertices get 0).
+    """
+
+    n = len(x)
+    significance = np.zeros(n)
+    if n == 0:
+        return significance
+
+    significance[0] = significance[-1] = np.inf
+
+    # Explicit stack of (start, stop, cap) instead of recursion; each segment is measured in one vectorized step
+    stack = [(0, n - 1, np.inf)]
+    while stack:
+        start, stop, cap = stack.pop()
+        if stop - start < 2:
+            continue
+
+        distances = _segment_distances(x, y, start, stop)
+        split = int(np.argmax(distances))
+        deviation = distances[split]
+        if deviation < min_tolerance_m:
+            continue
+
+        split += start + 1
+        significance[split] = min(deviation, cap)
+        stack.append((start, split, significance[split]))
+        stack.append((split, stop, significance[split]))
+
+    return significance
+
+def simplify_mask(significance, tolerance_m, max_vertices = DEFAULT_MAX_VERTICES):
+    """Vertices kept at tolerance_m, reduced to the max_vertices most significant ones --> returns np.ndarray of bool"""
+
+    keep = significance >= tolerance_m
+    if max_vertices is not None and keep.sum() > max_vertices:
+        keep = np.zeros(len(significance), dtype=bool)
+        keep[np.argpartition(-significance, max_vertices - 1)[:max_vertices]] = True
+
+    return keep
+
+def filter_accuracy(geo_df, max_accuracy_m = DEFAULT_MAX_ACCURACY_M):
+    """Drop fixes without coordinates or with locationAccuracy above max_accuracy_m and returns pd.DataFrame"""
+
+    valid = geo_df["latitude"].notna() & geo_df["longitude"].notna()
+    if max_accuracy_m is not None and "locationAccuracy" in geo_df:
+        # Fixes that do not report an accuracy are kept
+        valid &= ~(geo_df["locationAccuracy"] > max_accuracy_m)
+
+    return geo_df.loc[valid]
+
+def simplify_track(geo_df, tolerance_m = DETAIL_LEVELS_M[1], max_vertices = DEFAULT_MAX_VERTICES,
+                   max_accuracy_m = DEFAULT_MAX_ACCURACY_M):
+    """Simplify a location track (sorted by time) with Douglas-Peucker and returns pd.DataFrame
+
+    :param geo_df: location frame with latitude, longitude (and locationAccuracy) columns
+    :param tolerance_m: maximum deviation (m) of the simplified track from the filtered one
+    :param max_vertices: bound on the number of rows returned (None = no bound)
+    :param max_accuracy_m: drop fixes less accurate than this first (None = keep all)
+    """
+
+    return track_levels(geo_df, [tolerance_m], max_vertices, max_accuracy_m)[tolerance_m]
+
+def track_levels(geo_df, tolerances_m = DETAIL_LEVELS_M, max_vertices = DEFAULT_MAX_VERTICES,
+                 max_accuracy_m = DEFAULT_MAX_ACCURACY_M):
+    """Precompute simplified tracks for several tolerances at once and returns dict of tolerance -> pd.DataFrame"""
+
+    track = filter_accuracy(geo_df, max_accuracy_m)
+    x, y = project_local(track["latitude"], track["longitude"])
+    significance = track_significance(x, y, min(tolerances_m))
+
+    return {tolerance: track.loc[simplify_mask(significance, tolerance, max_vertices)] for tolerance in tolerances_m}
+
+### Spatial / temporal index of the fixes of one run
+
+class LocationIndex:
+    """Fixes of one run indexed in space (cKDTree on projected x/y metres) and time (sorted timestamps)
+
+    Built once per run (see ediary2_dataset.EDiaryDataset.location_index); radius and nearest
+    neighbour queries then cost a tree lookup per query point instead of a cross join. The
+    equirectangular projection is accurate to well below a metre over the extent of a run.
+    Row positions returned by the queries refer to self.fixes (sorted by timestamp).
+    """
+
+    def __init__(self, geo_df, max_accuracy_m = DEFAULT_MAX_ACCURACY_M):
+        fixes = filter_accuracy(geo_df, max_accuracy_m)
+        order = np.argsort(fixes["timestamp"].to_numpy(), kind="stable")
+        self.fixes = fixes.iloc[order].reset_index(drop=True)
+        self.timestamps = self.fixes["timestamp"].to_numpy(dtype=np.int64)
+
+        latitude = self.fixes["latitude"].to_numpy(dtype=float)
+        self.reference_latitude = float(np.mean(latitude)) if len(latitude) else 0.0
+        self.xy = self.project(latitude, self.fixes["longitude"].to_numpy(dtype=float))
+        self.tree = cKDTree(self.xy)
+
+    def __len__(self):
+        return len(self.fixes)
+
+    def __sizeof__(self):
+        # Fixes, projected coordinates and roughly as much again for the tree (reported to ediary2_cache)
+        return int(self.fixes.memory_usage(deep=True).sum()) + 2 * self.xy.nbytes + self.timestamps.nbytes
+
+    def project(self, latitude, longitude):
+        """Points as (n, 2) x/y metres in the plane of the index --> returns np.ndarray"""
+
+        x, y = project_local(latitude, longitude, self.reference_latitude)
+        return np.column_stack([x, y])
+
+    def nearest(self, latitude, longitude, max_distance_m = np.inf):
+        """Nearest fix of every point --> returns (distances in m, fix positions), inf and -1 where none is within max_distance_m"""
+
+        if len(self) == 0:
+            return np.full(len(latitude), np.inf), np.full(len(latitude), -1)
+
+        distances, positions = self.tree.query(self.project(latitude, longitude), distance_upper_bound=max_distance_m)
+        return distances, np.where(np.isfinite(distances), positions, -1)
+
+    def within(self, latitude, longitude, radius_m):
+        """All fixes within radius_m of every point --> returns (point positions, fix positions, distances in m)
+
+        One row per (point, fix) pair ordered by point, then fix, so np.bincount(points) counts the fixes
+        per point. The pairs come from a dual-tree traversal (cKDTree.sparse_distance_matrix), with no
+        per-point Python lists.
+        """
+
+        points = self.project(latitude, longitude)
+        if len(self) == 0 or len(points) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+
+        pairs = cKDTree(points).sparse_distance_matrix(self.tree, radius_m, output_type="ndarray")
+        pairs = pairs[np.argsort(pairs["i"] * len(self) + pairs["j"])]
+
+        return pairs["i"], pairs["j"], pairs["v"]
+
+    def count_within(self, latitude, longitude, radius_m):
+        """Number of fixes within radius_m of every point (no pairs are materialized) --> returns np.ndarray"""
+
+        if len(self) == 0:
+            return np.zeros(len(latitude), dtype=np.int64)
+
+        return self.tree.query_ball_point(self.project(latitude, longitude), radius_m, return_length=True)
+
+    def between(self, start, end):
+        """Positions of the fixes with start <= timestamp <= end (Unix ms) --> returns slice"""
+
+        return slice(np.searchsorted(self.timestamps, start, side="left"),
+                     np.searchsorted(self.timestamps, end, side="right"))
+
+    def nearest_in_time(self, timestamps, tolerance_ms = None):
+        """Position of the fix closest in time to every timestamp (Unix ms) --> returns np.ndarray, -1 beyond tolerance_ms"""
+
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        if len(self) == 0:
+            return np.full(len(timestamps), -1)
+
+        # The closest fix is the one just before or just after each timestamp
+        after = np.clip(np.searchsorted(self.timestamps, timestamps, side="left"), 0, len(self) - 1)
+        before = np.clip(after - 1, 0, len(self) - 1)
+        use_before = np.abs(timestamps - self.timestamps[before]) <= np.abs(self.timestamps[after] - timestamps)
+        positions = np.where(use_before, before, after)
+
+        if tolerance_ms is not None:
+            positions[np.abs(self.timestamps[positions] - timestamps) > tolerance_ms] = -1
+
+        return positions
+
+def fixes_near_feedback(index, feedback, radius_m = 50):
+    """Fixes within radius_m of each feedback event and returns pd.DataFrame
+
+    One row per (feedback event, fix) pair with the feedback's original_idx, the fix's
+    original_idx / timestamp_utc, their distance and the time of the fix relative to the answer.
+    """
+
+    feedback = feedback[feedback["latitude"].notna() & feedback["longitude"].notna()]
+    events, fixes, distances = index.within(feedback["latitude"].to_numpy(), feedback["longitude"].to_numpy(), radius_m)
+
+    return pd.DataFrame({"feedback_idx": feedback["original_idx"].to_numpy()[events],
+                         "fix_idx": index.fixes["original_idx"].to_numpy()[fixes],
+                         "fix_timestamp_utc": index.fixes["timestamp_utc"].to_numpy()[fixes],
+                         "distance_m": distances,
+                         "time_offset_s": (index.timestamps[fixes] - feedback["timestamp"].to_numpy(dtype=np.int64)[events]) / 1000})
+
+def locate_samples(index, df, tolerance_ms = 10_000):
+    """Add the latitude / longitude of the fix closest in time to every row of a sensor frame and returns pd.DataFrame
+
+    Rows without a fix within tolerance_ms get NaN coordinates; fix_offset_s is the fix time minus the sample time.
+    """
+
+    positions = index.nearest_in_time(df["timestamp"].to_numpy(), tolerance_ms)
+    found = positions >= 0
+    located = df.copy()
+
+    for column in ("latitude", "longitude"):
+        values = np.full(len(df), np.nan)
+        values[found] = index.fixes[column].to_numpy(dtype=float)[positions[found]]
+        located[column] = values
+
+    offsets = np.full(len(df), np.nan)
+    offsets[found] = (index.timestamps[positions[found]] - df["timestamp"].to_numpy(dtype=np.int64)[found]) / 1000
+    located["fix_offset_s"] = offsets
+
+    return located
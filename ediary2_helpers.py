@@ -1,6 +1,13 @@
 import sqlite3
+import numpy as np
 import pandas as pd
 import os
+import time
+
+import ediary2_db
+import ediary2_profiling
+import ediary2_parquet
+import ediary2_catalog
 
 from datetime import datetime, timezone
 
@@ -10,467 +17,690 @@ def convert_to_utc(ts_ms):
     dt = datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc)
     return dt.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3] + ' UTC'  # Trim to milliseconds
 
-def retrieve_all_bwa_data(db_file, table_name = 'doubleEventData'):
-    """Retrieve Breathing wave amplitude (BWA) from .db file and returns pd.DataFrame"""
+# Vectorized versions for whole columns: keep tz-aware datetimes in the frames
+# and only build strings when something is displayed
 
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-    
-    # Retrieve all data from the specified table
-    #cursor.execute(f"SELECT * FROM {table_name}")
+def convert_timestamps_to_utc(ts_ms):
+    """Convert a column of Unix timestamps (in ms) to tz-aware UTC datetimes --> returns datetime64[ms, UTC] pd.Series"""
+    return pd.to_datetime(ts_ms, unit='ms', utc=True).astype('datetime64[ms, UTC]')
 
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {8}')
-    
-    # Fetch all rows from the table
-    rows = cursor.fetchall()
-    
-    # Print the data
-    #print(f"\nData from table: {table_name}")
-    #for row in rows:
-    #    print(row)
-    
-    # Close the connection
-    conn.close()
+def format_utc(timestamps_utc):
+    """Format a column of UTC datetimes like convert_to_utc (for display / popups) --> returns pd.Series of str"""
+    return timestamps_utc.dt.strftime('%Y-%m-%d %H:%M:%S.%f').str[:-3] + ' UTC'
 
-    df = pd.DataFrame(rows, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "BWA"])
+### Query filters
 
-    df['timestamp_utc'] = df['timestamp'].apply(convert_to_utc)
+def _to_epoch_ms(value):
+    """Convert a time bound (Unix ms, datetime or pd.Timestamp, naive = UTC) to Unix ms"""
 
-    return df 
+    if isinstance(value, (int, np.integer)):
+        return int(value)
 
-def retrieve_all_ecg_amplitude_data(db_file, table_name = 'doubleEventData'):
-    """Retrieve ECG Amplitude from .db file and returns pd.DataFrame"""
+    value = pd.Timestamp(value)
+    if value.tzinfo is None:
+        value = value.tz_localize('UTC')
 
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-    
-    # Retrieve all data from the specified table
-    #cursor.execute(f"SELECT * FROM {table_name}")
+    return value.value // 1_000_000
 
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {9}')
-    
-    # Fetch all rows from the table
-    rows = cursor.fetchall()
-    
-    # Print the data
-    #print(f"\nData from table: {table_name}")
-    #for row in rows:
-    #    print(row)
-    
-    # Close the connection
-    conn.close()
+def _event_filter(platform_id, sensor_ids, run_id=None, start=None, end=None):
+    """Build the WHERE clause of an event table query --> returns (sql, parameters)
 
-    df = pd.DataFrame(rows, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "ecg_ampl"])
+    run_id and the [start, end] time range (both bounds inclusive, optional) are
+    pushed down into SQL so only the selected participant's rows are read.
+    """
 
-    df['timestamp_utc'] = df['timestamp'].apply(convert_to_utc)
+    placeholders = ", ".join("?" for _ in sensor_ids)
+    clauses = ["platformId = ?", f"sensorId IN ({placeholders})"]
+    params = [platform_id, *[int(sensor_id) for sensor_id in sensor_ids]]
 
-    return df 
+    if run_id is not None:
+        clauses.append("runId = ?")
+        params.append(int(run_id))
 
-def retrieve_all_ecg_noise_data(db_file, table_name = 'doubleEventData'):
-    """Retrieve ECG Noise from .db file and returns pd.DataFrame"""
+    if start is not None:
+        clauses.append("timestamp >= ?")
+        params.append(_to_epoch_ms(start))
 
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-    
-    # Retrieve all data from the specified table
-    #cursor.execute(f"SELECT * FROM {table_name}")
+    if end is not None:
+        clauses.append("timestamp <= ?")
+        params.append(_to_epoch_ms(end))
 
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {10}')
-    
-    # Fetch all rows from the table
-    rows = cursor.fetchall()
-    
-    # Print the data
-    #print(f"\nData from table: {table_name}")
-    #for row in rows:
-    #    print(row)
-    
-    # Close the connection
-    conn.close()
+    return " AND ".join(clauses), params
 
-    df = pd.DataFrame(rows, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "ecg_noise"])
+def _read_snapshot_stream(snapshot, name, run_id=None, start=None, end=None):
+    """Read a stream from a Parquet snapshot directory with the same filters as the SQL loaders"""
 
-    df['timestamp_utc'] = df['timestamp'].apply(convert_to_utc)
+    return ediary2_parquet.read_stream(snapshot, name, run_id,
+                                       None if start is None else _to_epoch_ms(start),
+                                       None if end is None else _to_epoch_ms(end))
 
-    return df 
+### Chunked reading
 
-def retrieve_all_resp_rate_data(db_file, table_name = 'doubleEventData'):
-    """Retrieve respiration rate from .db file and returns pd.DataFrame"""
+# Rows fetched from SQLite per chunk: bounds the Python tuples alive at any time
+DEFAULT_CHUNKSIZE = 10_000
 
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-    
-    # Retrieve all data from the specified table
-    #cursor.execute(f"SELECT * FROM {table_name}")
+# dtypes of results without rows (nothing to infer them from): ids and Unix ms as int64, text as object, the rest float64
+INTEGER_COLUMNS = {"original_idx", "runID", "timestamp", "platformID", "sensorID",
+                   "feelingDefinitionId", "causeDefinitionId", "intensity"}
+TEXT_COLUMNS = {"feelingDescription", "causeDescription", "note"}
 
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {2}')
-    
-    # Fetch all rows from the table
-    rows = cursor.fetchall()
-    
-    # Print the data
-    #print(f"\nData from table: {table_name}")
-    #for row in rows:
-    #    print(row)
-    
-    # Close the connection
-    conn.close()
+def _chunk_frame(rows, columns, utc=True):
+    """Build a pd.DataFrame from fetched rows and add the converted timestamp_utc column (unless utc=False)"""
 
-    df = pd.DataFrame(rows, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "resp_rate"])
+    df = pd.DataFrame(rows, columns=columns)
+    if len(df) == 0:
+        df = df.astype({column: "int64" if column in INTEGER_COLUMNS else "float64"
+                        for column in columns if column not in TEXT_COLUMNS})
+    if utc:
+        df['timestamp_utc'] = convert_timestamps_to_utc(df['timestamp'])
 
-    df['timestamp_utc'] = df['timestamp'].apply(convert_to_utc)
+    return df
 
-    return df 
+def _iter_query_chunks(db_file, query, params, columns, chunksize=DEFAULT_CHUNKSIZE, utc=True):
+    """Run a query and yield its result as pd.DataFrame chunks of at most chunksize rows (fetchmany)"""
 
+    # Borrow a cursor on the shared read-only connection
+    with ediary2_db.read_cursor(db_file) as cursor:
+        cursor.execute(query, params)
 
-def retrieve_all_heart_rate_data(db_file, table_name = 'longEventData'):
-    """Retrieve respiration rate from .db file and returns pd.DataFrame"""
+        while True:
+            rows = cursor.fetchmany(chunksize)
+            if not rows:
+                break
+            yield _chunk_frame(rows, columns, utc)
 
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-    
-    # Retrieve all data from the specified table
-    #cursor.execute(f"SELECT * FROM {table_name}")
+def _new_buffer():
+    """Empty column buffer for _buffer_append"""
 
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {1}')
-    
-    # Fetch all rows from the table
-    rows = cursor.fetchall()
-    
-    # Print the data
-    #print(f"\nData from table: {table_name}")
-    #for row in rows:
-    #    print(row)
-    
-    # Close the connection
-    conn.close()
+    return {"filled": 0, "columns": {}}
+
+def _buffer_append(buffer, chunk, columns, capacity=None):
+    """Copy a chunk into column arrays, allocated once with the expected number of rows (capacity)
+
+    The arrays are only reallocated when a chunk does not fit (no or a too small capacity:
+    they grow geometrically) or needs a wider dtype (a NULL value turns integers into floats).
+    """
+
+    filled, rows = buffer["filled"], len(chunk)
+    for column in columns:
+        values = chunk[column].to_numpy()
+        array = buffer["columns"].get(column)
+        if array is None:
+            array = np.empty(max(capacity or 0, rows), dtype=values.dtype)
+        else:
+            dtype = np.result_type(array.dtype, values.dtype)
+            if dtype != array.dtype or filled + rows > len(array):
+                size = len(array) if filled + rows <= len(array) else max(2 * len(array), filled + rows)
+                grown = np.empty(size, dtype=dtype)
+                grown[:filled] = array[:filled]
+                array = grown
+        array[filled:filled + rows] = values
+        buffer["columns"][column] = array
+
+    buffer["filled"] = filled + rows
+
+def _buffer_frame(buffer, columns, utc=True):
+    """pd.DataFrame of the filled part of a buffer plus the timestamp_utc column (unless utc=False)"""
+
+    filled = buffer["filled"]
+    arrays = buffer["columns"]
+    if not arrays:
+        return _chunk_frame([], columns, utc)
+
+    # Copy only when the buffer was oversized (time filter, growth), so the unused tail is released
+    oversized = any(len(array) > filled for array in arrays.values())
+    df = pd.DataFrame({column: arrays[column][:filled] for column in columns}, copy=oversized)
+    if utc:
+        df['timestamp_utc'] = convert_timestamps_to_utc(df['timestamp'])
+
+    return df
 
-    df = pd.DataFrame(rows, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "heart_rate"])
-    df['timestamp_utc'] = df['timestamp'].apply(convert_to_utc)
+def _read_query(db_file, query, params, columns, chunksize=DEFAULT_CHUNKSIZE, capacity=None, utc=True):
+    """Run a query chunk by chunk into preallocated column arrays and returns one pd.DataFrame
 
-    return df 
+    Only one chunk of Python tuples exists at a time (no fetchall) and no list of chunk
+    frames is kept for a final concat. With capacity, the expected number of rows (e.g. from
+    the schema catalog), the arrays are allocated once; without it they grow geometrically.
+    """
 
+    buffer = _new_buffer()
+    for chunk in _iter_query_chunks(db_file, query, params, columns, chunksize, utc=False):
+        _buffer_append(buffer, chunk, columns, capacity)
 
-def retrieve_all_posture_data(db_file, table_name = 'longEventData'):
+    return _buffer_frame(buffer, columns, utc)
+
+### Smartphone Data
+
+LOCATION_COLUMNS = ["original_idx", "runID", "timestamp", "platformID", "sensorID", 
+                    "latitude", "longitude", "altitude", "mslAltitude", "bearing", "speed", 
+                    "locationAccuracy", "bearingAccuracy", "speedAccuracy",
+                    "mslAltitudeAccuracy", "verticalAccuracy"]
+
+@ediary2_profiling.profiled
+def retrieve_location_data(db_file, table_name = 'locationEventData', run_id=None, start=None, end=None):
+    """Retrieve location from .db file (or Parquet snapshot) and returns pd.DataFrame"""
+
+    if ediary2_parquet.is_snapshot(db_file):
+        return _read_snapshot_stream(db_file, "location", run_id, start, end)
+
+    where, params = _event_filter(1, [900], run_id, start, end)
+
+    counts = ediary2_catalog.sensor_counts(db_file, table_name, 1, run_id)
+    capacity = None if counts is None else counts.get(900, 0)
+    return _read_query(db_file, f'SELECT * FROM {table_name} WHERE {where}', params, LOCATION_COLUMNS, capacity=capacity)
+
+### Feedback / Survey Data
+
+FEEDBACK_COLUMNS = ["original_idx", "runID", "feelingDefinitionId", "causeDefinitionId",
+                    "feelingDescription", "causeDescription", "intensity", "note",
+                    "timestamp",  
+                    "latitude", "longitude", "altitude", "mslAltitude", "bearing", "speed", 
+                    "locationAccuracy", "bearingAccuracy", "speedAccuracy",
+                    "mslAltitudeAccuracy", "verticalAccuracy",
+                    "platformID", "sensorID"]
+
+@ediary2_profiling.profiled
+def retrieve_feedback_data(db_file, table_name = 'feedbackEventData', run_id=None, start=None, end=None):
+    """Retrieve survey feedback from .db file (or Parquet snapshot) and returns pd.DataFrame"""
+
+    if ediary2_parquet.is_snapshot(db_file):
+        return _read_snapshot_stream(db_file, "feedback", run_id, start, end)
+
+    where, params = _event_filter(1, [800], run_id, start, end)
+
+    counts = ediary2_catalog.sensor_counts(db_file, table_name, 1, run_id)
+    capacity = None if counts is None else counts.get(800, 0)
+    return _read_query(db_file, f'SELECT * FROM {table_name} WHERE {where}', params, FEEDBACK_COLUMNS, capacity=capacity)
+
+### Participant runs
+
+# Parquet snapshot streams of the smartphone tables (sensors are stored under their value column)
+SNAPSHOT_STREAMS = {
+    "locationEventData": ["location"],
+    "feedbackEventData": ["feedback"],
+}
+
+@ediary2_profiling.profiled
+def retrieve_run_ids(db_file, table_name = 'locationEventData'):
+    """Retrieve the distinct runIDs recorded in a table of the .db file (or Parquet snapshot) and returns list"""
+
+    if ediary2_parquet.is_snapshot(db_file):
+        streams = SNAPSHOT_STREAMS.get(table_name) or \
+            [sensor for sensor, (sensor_table, _) in BIOHARNESS_SENSORS.items() if sensor_table == table_name]
+        return sorted(set().union(*[ediary2_parquet.read_run_ids(db_file, stream) for stream in streams]))
+
+    # Borrow a cursor on the shared read-only connection
+    with ediary2_db.read_cursor(db_file) as cursor:
+        cursor.execute(f'SELECT DISTINCT runId FROM {table_name} ORDER BY runId')
+
+        run_ids = [row[0] for row in cursor.fetchall()]
+
+    return run_ids
+
+@ediary2_profiling.profiled
+def retrieve_run_data(db_file, table_name = 'run', run_id=None):
+    """Retrieve participant run information (optionally of a single run) from .db file (or Parquet snapshot) and returns pd.DataFrame"""
+
+    if ediary2_parquet.is_snapshot(db_file):
+        return ediary2_parquet.read_runs(db_file, run_id)
+
+    # Borrow a cursor on the shared read-only connection
+    with ediary2_db.read_cursor(db_file) as cursor:
+        if run_id is None:
+            cursor.execute(f'SELECT * FROM {table_name} ')
+        else:
+            cursor.execute(f'SELECT * FROM {table_name} WHERE id = ?', [int(run_id)])
+
+        # Fetch all rows from the table
+        data = cursor.fetchall()
+
+    df = pd.DataFrame(data, columns=["id", "start", "end", "study", 
+                                     "name", "birthYear", "gender", "email", "note", "configurationID", 
+                                     "appVersion", "androidSdk", "device"])
+    
+    df['timestamp_start_utc'] = convert_timestamps_to_utc(df['start'])
+    df['timestamp_end_utc'] = convert_timestamps_to_utc(df['end'])
+
+    return df[["id", "name", "study", "timestamp_start_utc", "timestamp_end_utc", 
+                "birthYear", "gender", "email", "note", "start", "end", 
+                "configurationID", "appVersion", "androidSdk", "device"]]
+
+### Zephyr BioHarness sensor codes
+
+BIOHARNESS_PLATFORM_ID = 2
+
+# value column -> (event table, sensorId)
+BIOHARNESS_SENSORS = {
+    "BWA": ("doubleEventData", 8),
+    "ecg_ampl": ("doubleEventData", 9),
+    "ecg_noise": ("doubleEventData", 10),
+    "resp_rate": ("doubleEventData", 2),
+    "vector_mag_u": ("doubleEventData", 12),
+    "peak_acc": ("doubleEventData", 5),
+    "acc_min_x": ("doubleEventData", 101),
+    "acc_min_y": ("doubleEventData", 102),
+    "acc_min_z": ("doubleEventData", 103),
+    "acc_peak_x": ("doubleEventData", 111),
+    "acc_peak_y": ("doubleEventData", 112),
+    "acc_peak_z": ("doubleEventData", 113),
+    "heart_rate": ("longEventData", 1),
+    "posture": ("longEventData", 4),
+    "color": ("longEventData", 6),
+    "worn_status": ("longEventData", 13),
+    "battery": ("longEventData", 999),
+}
+
+# Tri-axial accelerometer streams, merged on timestamp into one pd.DataFrame
+ACC_AXES = {
+    "acc_min": ("acc_min_x", "acc_min_y", "acc_min_z"),
+    "acc_peak": ("acc_peak_x", "acc_peak_y", "acc_peak_z"),
+}
+
+EVENT_COLUMNS = ["original_idx", "runID", "timestamp", "platformID", "sensorID"]
+
+def _retrieve_sensor_frames(db_file, table_name, sensors, run_id=None, start=None, end=None):
+    """Retrieve several sensors of one event table with a single scan and returns dict of pd.DataFrame
+
+    The schema catalog (ediary2_catalog) tells which sensors were recorded and how many rows
+    each has: absent sensors are not queried at all and the others are filled into buffers
+    sized up front instead of concatenating a list of chunks.
+    """
+
+    if ediary2_parquet.is_snapshot(db_file):
+        return {sensor: _read_snapshot_stream(db_file, sensor, run_id, start, end) for sensor in sensors}
+
+    # Sensors without any recordings still get an empty frame with the expected columns
+    empty = _chunk_frame([], EVENT_COLUMNS + ["value"])
+    frames = {sensor: empty.rename(columns={"value": sensor}) for sensor in sensors}
+
+    # Tables the catalog does not know are queried for every sensor, with buffers grown as needed
+    counts = ediary2_catalog.sensor_counts(db_file, table_name, BIOHARNESS_PLATFORM_ID, run_id)
+    sensor_names = {BIOHARNESS_SENSORS[sensor][1]: sensor for sensor in sensors
+                    if counts is None or counts.get(BIOHARNESS_SENSORS[sensor][1], 0) > 0}
+    if not sensor_names:
+        return frames
+
+    where, params = _event_filter(BIOHARNESS_PLATFORM_ID, list(sensor_names), run_id, start, end)
+
+    # Partition each chunk of the scan by sensor (row order within a sensor is kept)
+    columns = EVENT_COLUMNS + ["value"]
+    buffers = {sensor_id: _new_buffer() for sensor_id in sensor_names}
+    for chunk in _iter_query_chunks(db_file, f'SELECT * FROM {table_name} WHERE {where}', params, columns, utc=False):
+        for sensor_id, group in chunk.groupby("sensorID", sort=False):
+            _buffer_append(buffers[sensor_id], group, columns, None if counts is None else counts[sensor_id])
+
+    for sensor_id, buffer in buffers.items():
+        if buffer["filled"]:
+            frames[sensor_names[sensor_id]] = _buffer_frame(buffer, columns).rename(columns={"value": sensor_names[sensor_id]})
+
+    return frames
+
+def pivot_axes(df, axis_columns, complete_only=True):
+    """Pivot long-format rows of several sensors into one row per (runID, timestamp) and returns pd.DataFrame
+
+    Sort-based instead of joining one frame per sensor: the rows are ordered by
+    (runID, timestamp, sensorID) with np.lexsort and every run of equal
+    (runID, timestamp) keys becomes one sample, so there are no hash joins.
+
+    :param df: rows with a "value" column plus runID, timestamp and sensorID
+    :param axis_columns: dict sensorID -> output column, e.g. {101: "acc_min_x", ...}
+    :param complete_only: drop samples where an axis is missing (otherwise it is NaN)
+    :return: one row per sample with the other columns taken from its first row
+             (lowest sensorID, i.e. the x axis when present) and one column per axis
+    """
+
+    order = np.lexsort((df["sensorID"].to_numpy(), df["timestamp"].to_numpy(), df["runID"].to_numpy()))
+    run_ids = df["runID"].to_numpy()[order]
+    timestamps = df["timestamp"].to_numpy()[order]
+
+    # A new sample starts wherever (runID, timestamp) changes in sorted order
+    starts = np.ones(len(order), dtype=bool)
+    starts[1:] = (run_ids[1:] != run_ids[:-1]) | (timestamps[1:] != timestamps[:-1])
+    sample = np.cumsum(starts) - 1
+    first_rows = order[starts]
+
+    data = df.drop(columns="value").iloc[first_rows].reset_index(drop=True)
+
+    # Scatter the values into a (samples x axes) array, NaN where an axis was not recorded
+    axis_position = pd.Index(list(axis_columns)).get_indexer(df["sensorID"].to_numpy()[order])
+    values = np.full((len(first_rows), len(axis_columns)), np.nan)
+    values[sample, axis_position] = df["value"].to_numpy(dtype=float)[order]
+
+    for position, column in enumerate(axis_columns.values()):
+        data[column] = values[:, position]
+
+    if complete_only:
+        data = data[~np.isnan(values).any(axis=1)].reset_index(drop=True)
+
+    return data
+
+def _pivot_acc_axes(data, acc, complete_only=True):
+    """Combine the x/y/z frames of an accelerometer stream into one row per sample and returns pd.DataFrame"""
+
+    axes = ACC_AXES[acc]
+    axis_columns = {BIOHARNESS_SENSORS[axis][1]: axis for axis in axes}
+
+    rows = pd.concat([data[axis].rename(columns={axis: "value"}) for axis in axes], ignore_index=True)
+    pivoted = pivot_axes(rows, axis_columns, complete_only)
+
+    return pivoted[EVENT_COLUMNS + list(axes) + ["timestamp_utc"]]
+
+def compact_frame(df):
+    """Shrink a sensor frame to the narrowest dtypes that hold its values and returns pd.DataFrame
+
+    Integer columns (ids, long sensor values) are downcast to the smallest integer type that
+    fits, double sensor values become float32, and platformID / sensorID are dropped when
+    they are constant (always for the frames of one sensor). Timestamps are kept as they are.
+    """
+
+    columns = {}
+    for column in df.columns:
+        series = df[column]
+        if column in ("platformID", "sensorID") and series.nunique(dropna=False) <= 1:
+            continue
+        if column in ("timestamp", "timestamp_utc"):
+            columns[column] = series
+        elif pd.api.types.is_integer_dtype(series):
+            columns[column] = pd.to_numeric(series, downcast="integer")
+        elif pd.api.types.is_float_dtype(series):
+            columns[column] = series.astype("float32")
+        else:
+            columns[column] = series
+
+    return pd.DataFrame(columns)
+
+@ediary2_profiling.profiled
+def retrieve_all_sensors_data(db_file, sensors=None, run_id=None, start=None, end=None, compact=False):
+    """Retrieve several BioHarness sensors reading each event table only once and returns dict of pd.DataFrame
+
+    :param db_file: path to the eDiary .db file (or a Parquet snapshot directory, see ediary2_parquet)
+    :param sensors: names from BIOHARNESS_SENSORS or ACC_AXES (default: all of BIOHARNESS_SENSORS)
+    :param run_id: only read this participant run (default: all runs)
+    :param start: only read samples at or after this time (Unix ms or datetime)
+    :param end: only read samples at or before this time (Unix ms or datetime)
+    :param compact: shrink every frame with compact_frame (less than half the memory)
+    :return: dict mapping each requested name to the pd.DataFrame its retrieve_all_* function returns
+    """
+
+    if sensors is None:
+        sensors = list(BIOHARNESS_SENSORS)
+
+    # Expand accelerometer streams into their axes and group the sensors by event table
+    tables = {}
+    for sensor in sensors:
+        for name in ACC_AXES.get(sensor, (sensor,)):
+            table_name = BIOHARNESS_SENSORS[name][0]
+            tables.setdefault(table_name, [])
+            if name not in tables[table_name]:
+                tables[table_name].append(name)
+
+    frames = {}
+    for table_name, table_sensors in tables.items():
+        frames.update(_retrieve_sensor_frames(db_file, table_name, table_sensors, run_id, start, end))
+
+    data = {sensor: _pivot_acc_axes(frames, sensor) if sensor in ACC_AXES else frames[sensor]
+            for sensor in sensors}
+
+    return {sensor: compact_frame(frame) for sensor, frame in data.items()} if compact else data
+
+def iter_sensor_chunks(db_file, sensor, chunksize=DEFAULT_CHUNKSIZE, run_id=None, start=None, end=None, columns=None):
+    """Yield the recordings of one BioHarness sensor as pd.DataFrame chunks of at most chunksize rows
+
+    The chunks have the columns of the corresponding retrieve_all_* frame (or only columns), so
+    whole-study aggregations can run with bounded memory (see reduce_sensor_chunks). Parquet
+    snapshots only read the requested columns from disk.
+    """
+
+    if ediary2_parquet.is_snapshot(db_file):
+        yield from ediary2_parquet.iter_stream_chunks(db_file, sensor, chunksize, run_id,
+                                                      None if start is None else _to_epoch_ms(start),
+                                                      None if end is None else _to_epoch_ms(end), columns)
+        return
+
+    table_name, sensor_id = BIOHARNESS_SENSORS[sensor]
+    where, params = _event_filter(BIOHARNESS_PLATFORM_ID, [sensor_id], run_id, start, end)
+
+    for chunk in _iter_query_chunks(db_file, f'SELECT * FROM {table_name} WHERE {where}', params,
+                                    EVENT_COLUMNS + [sensor], chunksize):
+        yield chunk if columns is None else chunk[columns]
+
+def reduce_sensor_chunks(db_file, sensor, reducer, initial=None, chunksize=DEFAULT_CHUNKSIZE, run_id=None, start=None, end=None,
+                         columns=None):
+    """Fold reducer(state, chunk) over the chunks of a sensor and returns the final state"""
+
+    state = initial
+    for chunk in iter_sensor_chunks(db_file, sensor, chunksize, run_id, start, end, columns):
+        state = reducer(state, chunk)
+
+    return state
+
+def _summarize_chunk(state, chunk, sensor):
+    """Reducer of summarize_sensor: combine per-run partial aggregates with those of a chunk"""
+
+    partial = chunk.groupby("runID").agg(count=(sensor, "count"), total=(sensor, "sum"),
+                                         min=(sensor, "min"), max=(sensor, "max"),
+                                         first_timestamp=("timestamp", "min"), last_timestamp=("timestamp", "max"))
+    if state is None:
+        return partial
+
+    combined = pd.concat([state, partial]).groupby(level=0)
+    return combined.agg({"count": "sum", "total": "sum", "min": "min", "max": "max",
+                         "first_timestamp": "min", "last_timestamp": "max"})
+
+def summarize_sensor(db_file, sensor, chunksize=DEFAULT_CHUNKSIZE, run_id=None, start=None, end=None):
+    """Per-run count, mean, min, max and time range of a sensor, computed chunk by chunk --> returns pd.DataFrame"""
+
+    # Only the three columns aggregated are read (pruned on disk for Parquet snapshots)
+    summary = reduce_sensor_chunks(db_file, sensor, lambda state, chunk: _summarize_chunk(state, chunk, sensor), None,
+                                   chunksize, run_id, start, end, columns=["runID", "timestamp", sensor])
+    if summary is None:
+        summary = _summarize_chunk(None, _chunk_frame([], EVENT_COLUMNS + [sensor]), sensor)
+
+    summary["mean"] = summary["total"] / summary["count"]
+
+    return summary[["count", "mean", "min", "max", "first_timestamp", "last_timestamp"]]
+
+@ediary2_profiling.profiled
+def retrieve_all_bwa_data(db_file, table_name = 'doubleEventData', run_id=None, start=None, end=None):
+    """Retrieve Breathing wave amplitude (BWA) from .db file and returns pd.DataFrame"""
+
+    return _retrieve_sensor_frames(db_file, table_name, ["BWA"], run_id, start, end)["BWA"]
+
+@ediary2_profiling.profiled
+def retrieve_all_ecg_amplitude_data(db_file, table_name = 'doubleEventData', run_id=None, start=None, end=None):
+    """Retrieve ECG Amplitude from .db file and returns pd.DataFrame"""
+
+    return _retrieve_sensor_frames(db_file, table_name, ["ecg_ampl"], run_id, start, end)["ecg_ampl"]
+
+@ediary2_profiling.profiled
+def retrieve_all_ecg_noise_data(db_file, table_name = 'doubleEventData', run_id=None, start=None, end=None):
+    """Retrieve ECG Noise from .db file and returns pd.DataFrame"""
+
+    return _retrieve_sensor_frames(db_file, table_name, ["ecg_noise"], run_id, start, end)["ecg_noise"]
+
+@ediary2_profiling.profiled
+def retrieve_all_resp_rate_data(db_file, table_name = 'doubleEventData', run_id=None, start=None, end=None):
     """Retrieve respiration rate from .db file and returns pd.DataFrame"""
 
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-    
-    # Retrieve all data from the specified table
-    #cursor.execute(f"SELECT * FROM {table_name}")
+    return _retrieve_sensor_frames(db_file, table_name, ["resp_rate"], run_id, start, end)["resp_rate"]
 
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {4}')
-    
-    # Fetch all rows from the table
-    rows = cursor.fetchall()
-    
-    # Print the data
-    #print(f"\nData from table: {table_name}")
-    #for row in rows:
-    #    print(row)
-    
-    # Close the connection
-    conn.close()
 
-    df = pd.DataFrame(rows, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "posture"])
+@ediary2_profiling.profiled
+def retrieve_all_heart_rate_data(db_file, table_name = 'longEventData', run_id=None, start=None, end=None):
+    """Retrieve heart rate from .db file and returns pd.DataFrame"""
+
+    return _retrieve_sensor_frames(db_file, table_name, ["heart_rate"], run_id, start, end)["heart_rate"]
+
 
-    df['timestamp_utc'] = df['timestamp'].apply(convert_to_utc)
+@ediary2_profiling.profiled
+def retrieve_all_posture_data(db_file, table_name = 'longEventData', run_id=None, start=None, end=None):
+    """Retrieve posture from .db file and returns pd.DataFrame"""
 
-    return df 
+    return _retrieve_sensor_frames(db_file, table_name, ["posture"], run_id, start, end)["posture"]
 
-def retrieve_all_color_data(db_file, table_name = 'longEventData'):
+@ediary2_profiling.profiled
+def retrieve_all_color_data(db_file, table_name = 'longEventData', run_id=None, start=None, end=None):
     """Retrieve color (red, orange, green) from .db file and returns pd.DataFrame"""
 
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-    
-    # Retrieve all data from the specified table
-    #cursor.execute(f"SELECT * FROM {table_name}")
+    return _retrieve_sensor_frames(db_file, table_name, ["color"], run_id, start, end)["color"]
 
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {6}')
-    
-    # Fetch all rows from the table
-    rows = cursor.fetchall()
-    
-    # Print the data
-    #print(f"\nData from table: {table_name}")
-    #for row in rows:
-    #    print(row)
-    
-    # Close the connection
-    conn.close()
+@ediary2_profiling.profiled
+def retrieve_all_vector_mag_units_data(db_file, table_name = 'doubleEventData', run_id=None, start=None, end=None):
+    """Retrieve vector magnitude units from .db file and returns pd.DataFrame"""
 
-    df = pd.DataFrame(rows, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "color"])
-    df['timestamp_utc'] = df['timestamp'].apply(convert_to_utc)
+    return _retrieve_sensor_frames(db_file, table_name, ["vector_mag_u"], run_id, start, end)["vector_mag_u"]
 
-    return df 
+@ediary2_profiling.profiled
+def retrieve_all_worn_status_data(db_file, table_name = 'longEventData', run_id=None, start=None, end=None):
+    """Retrieve status if device was worn from .db file and returns pd.DataFrame"""
 
-def retrieve_all_vector_mag_units_data(db_file, table_name = 'doubleEventData'):
-    """Retrieve respiration rate from .db file and returns pd.DataFrame"""
+    return _retrieve_sensor_frames(db_file, table_name, ["worn_status"], run_id, start, end)["worn_status"]
 
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-    
-    # Retrieve all data from the specified table
-    #cursor.execute(f"SELECT * FROM {table_name}")
+@ediary2_profiling.profiled
+def retrieve_all_peak_acc_data(db_file, table_name = 'doubleEventData', run_id=None, start=None, end=None):
+    """Retrieve peaks of acceleration from .db file and returns pd.DataFrame"""
 
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {12}')
-    
-    # Fetch all rows from the table
-    rows = cursor.fetchall()
-    
-    # Print the data
-    #print(f"\nData from table: {table_name}")
-    #for row in rows:
-    #    print(row)
-    
-    # Close the connection
-    conn.close()
+    return _retrieve_sensor_frames(db_file, table_name, ["peak_acc"], run_id, start, end)["peak_acc"]
 
-    df = pd.DataFrame(rows, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "vector_mag_u"])
-    df['timestamp_utc'] = df['timestamp'].apply(convert_to_utc)
+@ediary2_profiling.profiled
+def retrieve_all_acc_min_data(db_file, table_name = 'doubleEventData', run_id=None, start=None, end=None, complete_only=True):
+    """Retrieve mins of acceleration (x, y, z) from .db file and returns pd.DataFrame (one row per sample)
 
-    return df 
+    All three axes are read with one query and aligned by pivot_axes; samples missing
+    an axis are dropped unless complete_only is False (the axis is NaN then).
+    """
 
-def retrieve_all_worn_status_data(db_file, table_name = 'longEventData'):
-    """Retrieve respiration rate from .db file and returns pd.DataFrame"""
+    data = _retrieve_sensor_frames(db_file, table_name, ACC_AXES["acc_min"], run_id, start, end)
 
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-    
-    # Retrieve all data from the specified table
-    #cursor.execute(f"SELECT * FROM {table_name}")
+    return _pivot_acc_axes(data, "acc_min", complete_only)
 
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {13}')
-    
-    # Fetch all rows from the table
-    rows = cursor.fetchall()
-    
-    # Print the data
-    #print(f"\nData from table: {table_name}")
-    #for row in rows:
-    #    print(row)
-    
-    # Close the connection
-    conn.close()
+@ediary2_profiling.profiled
+def retrieve_all_acc_peak_data(db_file, table_name = 'doubleEventData', run_id=None, start=None, end=None, complete_only=True):
+    """Retrieve peaks of acceleration (x, y, z) from .db file and returns pd.DataFrame (one row per sample)
 
-    df = pd.DataFrame(rows, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "worn_status"])
-    df['timestamp_utc'] = df['timestamp'].apply(convert_to_utc)
+    All three axes are read with one query and aligned by pivot_axes; samples missing
+    an axis are dropped unless complete_only is False (the axis is NaN then).
+    """
 
-    return df 
+    data = _retrieve_sensor_frames(db_file, table_name, ACC_AXES["acc_peak"], run_id, start, end)
 
-def retrieve_all_peak_acc_data(db_file, table_name = 'doubleEventData'):
-    """Retrieve respiration rate from .db file and returns pd.DataFrame"""
+    return _pivot_acc_axes(data, "acc_peak", complete_only)
 
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-    
-    # Retrieve all data from the specified table
-    #cursor.execute(f"SELECT * FROM {table_name}")
+@ediary2_profiling.profiled
+def retrieve_all_battery_data(db_file, table_name = 'longEventData', run_id=None, start=None, end=None):
+    """Retrieve battery from .db file and returns pd.DataFrame"""
 
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {5}')
-    
-    # Fetch all rows from the table
-    rows = cursor.fetchall()
-    
-    # Print the data
-    #print(f"\nData from table: {table_name}")
-    #for row in rows:
-    #    print(row)
-    
-    # Close the connection
-    conn.close()
+    return _retrieve_sensor_frames(db_file, table_name, ["battery"], run_id, start, end)["battery"]
 
-    df = pd.DataFrame(rows, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "peak_acc"])
-    df['timestamp_utc'] = df['timestamp'].apply(convert_to_utc)
+### Per-run index
 
-    return df 
+def index_runs(df, run_column = "runID", time_column = "timestamp"):
+    """Sort a frame by run and time and locate each run's rows --> returns (pd.DataFrame, dict of run -> slice)
 
-def retrieve_all_acc_min_data(db_file, table_name = 'doubleEventData'):
-    """Retrieve respiration rate from .db file and returns pd.DataFrame"""
+    The rows of a run are contiguous afterwards, so run_slice() cuts them out without a
+    boolean mask or a copy. Frames already in that order (the usual insertion order) are not copied.
+    """
 
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-    
-    # Retrieve all data from the specified table
-    #cursor.execute(f"SELECT * FROM {table_name}")
+    runs = df[run_column].to_numpy()
+    times = df[time_column].to_numpy()
 
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {101}')
-    
-    # Fetch all rows from the table
-    rows_acc_x_min = cursor.fetchall()
+    ordered = (np.all(runs[1:] >= runs[:-1]) and
+               np.all((runs[1:] != runs[:-1]) | (times[1:] >= times[:-1])))
+    if not ordered:
+        order = np.lexsort((times, runs))
+        df = df.take(order).reset_index(drop=True)
+        runs = runs[order]
 
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {102}')
+    run_ids, starts = np.unique(runs, return_index=True)
+    stops = np.append(starts[1:], len(runs))
 
-    rows_acc_y_min = cursor.fetchall()
+    return df, {run: slice(start, stop) for run, start, stop in zip(run_ids.tolist(), starts.tolist(), stops.tolist())}
 
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {103}')
+def run_slice(df, offsets, run_id):
+    """Rows of one run of a frame indexed by index_runs (a view, empty for unknown runs) and returns pd.DataFrame"""
 
-    rows_acc_z_min = cursor.fetchall()
-    
-    # Print the data
-    #print(f"\nData from table: {table_name}")
-    #for row in rows:
-    #    print(row)
-    
-    # Close the connection
-    conn.close()
+    return df.iloc[offsets.get(run_id, slice(0, 0))]
 
-    data_x = pd.DataFrame(rows_acc_x_min, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "acc_min_x"])
-    data_y = pd.DataFrame(rows_acc_y_min, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "acc_min_y"])
-    data_z = pd.DataFrame(rows_acc_z_min, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "acc_min_z"])
-    data_x['timestamp_x_utc'] = data_x['timestamp'].apply(convert_to_utc)
+### Database preparation
 
-    data_y['timestamp_y_utc'] = data_y['timestamp'].apply(convert_to_utc)
+EVENT_TABLES = ["doubleEventData", "longEventData", "locationEventData", "feedbackEventData"]
 
-    data_z['timestamp_z_utc'] = data_z['timestamp'].apply(convert_to_utc)
+# Column order of the indexes matches the WHERE clauses of the loaders (equality first, then range)
+INDEX_COLUMNS = ["platformId", "sensorId", "runId", "timestamp"]
 
-    data_acc_min_xy = pd.merge(data_x, data_y[["timestamp", "timestamp_y_utc", "acc_min_y"]])
-    data_acc_min_xyz = pd.merge(data_acc_min_xy, data_z[["timestamp", "timestamp_z_utc", "acc_min_z"]])
+# Narrow value tables also get their remaining columns in the index, so SELECT * is served from it
+COVERING_TABLES = ["doubleEventData", "longEventData"]
 
-    return data_acc_min_xyz
+def _index_size(cursor, index_name):
+    """Size of an index in bytes (None if the dbstat virtual table is not compiled in)"""
 
-def retrieve_all_acc_peak_data(db_file, table_name = 'doubleEventData'):
-    """Retrieve respiration rate from .db file and returns pd.DataFrame"""
+    try:
+        cursor.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = ?", [index_name])
+    except sqlite3.OperationalError:
+        return None
+
+    return cursor.fetchone()[0]
+
+def create_event_indexes(db_file, tables = EVENT_TABLES):
+    """Build (platformId, sensorId, runId, timestamp) indexes on the event tables of a .db file and run ANALYZE
+
+    Tables that are missing or already indexed are skipped, so it is cheap to call
+    repeatedly. Returns a pd.DataFrame with the build time and size of every index.
+    """
 
     # Connect to the SQLite database
     conn = sqlite3.connect(db_file)
     
     # Create a cursor object to interact with the database
     cursor = conn.cursor()
-    
-    # Retrieve all data from the specified table
-    #cursor.execute(f"SELECT * FROM {table_name}")
 
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {111}')
-    
-    # Fetch all rows from the table
-    rows_acc_x_min = cursor.fetchall()
+    report = []
+    for table_name in tables:
+        cursor.execute(f"PRAGMA table_info({table_name});")
+        columns = [column[1] for column in cursor.fetchall()]
 
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {112}')
+        # SQLite column names are case-insensitive (runId / runID): index under the file's own spelling
+        spelling = {column.lower(): column for column in columns}
 
-    rows_acc_y_min = cursor.fetchall()
+        # Not an eDiary event table (or an older app version without it)
+        if not {column.lower() for column in INDEX_COLUMNS}.issubset(spelling):
+            continue
 
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {113}')
+        index_columns = [spelling[column.lower()] for column in INDEX_COLUMNS]
+        if table_name in COVERING_TABLES:
+            index_columns += [column for column in columns[1:] if column not in index_columns]
 
-    rows_acc_z_min = cursor.fetchall()
-    
-    # Print the data
-    #print(f"\nData from table: {table_name}")
-    #for row in rows:
-    #    print(row)
-    
-    # Close the connection
-    conn.close()
+        index_name = f"idx_{table_name}_{'_'.join(INDEX_COLUMNS)}"
 
-    data_x = pd.DataFrame(rows_acc_x_min, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "acc_peak_x"])
-    data_x['timestamp_x_utc'] = data_x['timestamp'].apply(convert_to_utc)
-    data_y = pd.DataFrame(rows_acc_y_min, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "acc_peak_y"])
-    data_y['timestamp_y_utc'] = data_y['timestamp'].apply(convert_to_utc)
-    data_z = pd.DataFrame(rows_acc_z_min, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "acc_peak_z"])
-    data_z['timestamp_z_utc'] = data_z['timestamp'].apply(convert_to_utc)
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", [index_name])
+        if cursor.fetchone() is not None:
+            continue
 
-    data_acc_peak_xy = pd.merge(data_x, data_y[["timestamp", "timestamp_y_utc", "acc_peak_y"]])
-    data_acc_peak_xyz = pd.merge(data_acc_peak_xy, data_z[["timestamp", "timestamp_z_utc", "acc_peak_z"]])
+        page_count_before = cursor.execute("PRAGMA page_count;").fetchone()[0]
+        start = time.perf_counter()
 
-    return data_acc_peak_xyz
+        cursor.execute(f"CREATE INDEX {index_name} ON {table_name} ({', '.join(index_columns)});")
+        conn.commit()
 
-def retrieve_all_battery_data(db_file, table_name = 'longEventData'):
-    """Retrieve battery from .db file and returns pd.DataFrame"""
+        seconds = time.perf_counter() - start
+        size_bytes = _index_size(cursor, index_name)
+        if size_bytes is None:
+            page_size = cursor.execute("PRAGMA page_size;").fetchone()[0]
+            page_count_after = cursor.execute("PRAGMA page_count;").fetchone()[0]
+            size_bytes = (page_count_after - page_count_before) * page_size
 
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-    
-    # Retrieve all data from the specified table
-    #cursor.execute(f"SELECT * FROM {table_name}")
+        report.append({"table": table_name, "index": index_name, "columns": ", ".join(index_columns),
+                       "seconds": seconds, "size_bytes": size_bytes})
 
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {2} AND ' \
-                    f'sensorId = {999}')
-    
-    # Fetch all rows from the table
-    data_battery = cursor.fetchall()
+    # Refresh the query planner statistics once the new indexes exist
+    if report:
+        start = time.perf_counter()
+        cursor.execute("ANALYZE;")
+        conn.commit()
+        report.append({"table": "", "index": "ANALYZE", "columns": "",
+                       "seconds": time.perf_counter() - start, "size_bytes": 0})
 
-    
-    # Print the data
-    #print(f"\nData from table: {table_name}")
-    #for row in rows:
-    #    print(row)
-    
     # Close the connection
     conn.close()
 
-    df = pd.DataFrame(data_battery, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", "battery"])
-
-    df['timestamp_utc'] = df['timestamp'].apply(convert_to_utc)
-
-    return df
\ No newline at end of file
+    return pd.DataFrame(report, columns=["table", "index", "columns", "seconds", "size_bytes"])
@@ -0,0 +1,300 @@
+import glob
+import json
+import os
+import shutil
+import tempfile
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import ediary2_cache
+
+### Columnar Parquet snapshots of eDiary .db files
+#
+# <snapshot>/_manifest.json             source file, content hash and stream names
+# <snapshot>/run/part-0.parquet          participant runs
+# <snapshot>/<stream>/_schema.parquet    zero-row file with the stream's columns and dtypes
+# <snapshot>/<stream>/runID=<id>/part-<n>.parquet
+#
+# Streams are location, feedback and one per sensor of ediary2_helpers.BIOHARNESS_SENSORS.
+# Every file keeps all columns of the frame the helper functions return (including
+# runID and the converted timestamp_utc), so a snapshot is a drop-in replacement for
+# the .db file: pass its directory as db_file to the ediary2_helpers loaders.
+
+MANIFEST_NAME = "_manifest.json"
+SCHEMA_NAME = "_schema.parquet"
+
+def snapshot_path(db_file):
+    """Default snapshot directory of a .db file (next to it)"""
+
+    return os.path.splitext(db_file)[0] + "_parquet"
+
+def is_snapshot(source):
+    """True if source is a snapshot directory written by export_snapshot"""
+
+    return os.path.isfile(os.path.join(source, MANIFEST_NAME))
+
+def snapshot_is_current(db_file, snapshot):
+    """True if the snapshot exists and was written from the current content of db_file"""
+
+    if not is_snapshot(snapshot):
+        return False
+
+    with open(os.path.join(snapshot, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+
+    return manifest["source_hash"] == ediary2_cache.file_hash(db_file)
+
+# Rows buffered per (stream, run) before they are written as one row group, and in total over all
+# of them before every buffer is flushed; writers of at most MAX_OPEN_WRITERS runs are kept open
+ROW_GROUP_ROWS = 64 * 1024
+MAX_PENDING_ROWS = 1024 * 1024
+MAX_OPEN_WRITERS = 64
+
+class _RunPartitionWriter:
+    """Write the rows of every stream as runID=<id> partitions, buffering them into row groups
+
+    Rows of one (stream, run) go to one file as long as its writer stays open and the column
+    types do not change; otherwise a next part-<n>.parquet is started (read_stream reads
+    all parts of a run with the stream's unified schema).
+    """
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.pending = {}   # (stream, run) -> list of pa.Table
+        self.pending_rows = 0
+        self.writers = {}   # (stream, run) -> pq.ParquetWriter, least recently used first
+        self.parts = {}     # (stream, run) -> number of part files started
+        self.schemas = {}   # stream -> list of pa.Schema of the written rows
+        self.empty = {}     # stream -> pa.Schema of the stream without rows
+
+    def add(self, name, df):
+        """Buffer the rows of a stream frame, split by runID"""
+
+        self.schemas.setdefault(name, [])
+        for run_id, group in df.groupby("runID", sort=False):
+            key = (name, int(run_id))
+            self.pending.setdefault(key, []).append(pa.Table.from_pandas(group, preserve_index=False))
+            self.pending_rows += len(group)
+            if sum(table.num_rows for table in self.pending[key]) >= ROW_GROUP_ROWS:
+                self._flush(key)
+
+        if self.pending_rows >= MAX_PENDING_ROWS:
+            for key in list(self.pending):
+                self._flush(key)
+
+    def declare(self, name, empty):
+        """Register a stream with its empty frame, whose schema is used when no rows are added"""
+
+        self.schemas.setdefault(name, [])
+        self.empty[name] = pa.Schema.from_pandas(empty, preserve_index=False)
+
+    def _flush(self, key):
+        tables = self.pending.pop(key)
+        self.pending_rows -= sum(table.num_rows for table in tables)
+
+        schema = pa.unify_schemas([table.schema for table in tables], promote_options="permissive")
+        table = pa.concat_tables([table.cast(schema) for table in tables])
+
+        writer = self.writers.pop(key, None)
+        if writer is not None and pa.unify_schemas([writer.schema, schema], promote_options="permissive") == writer.schema:
+            table = table.cast(writer.schema)
+        else:
+            if writer is not None:
+                writer.close()
+            writer = self._open(key, schema)
+        writer.write_table(table)
+        self.writers[key] = writer
+
+        while len(self.writers) > MAX_OPEN_WRITERS:
+            self.writers.pop(next(iter(self.writers))).close()
+
+    def _open(self, key, schema):
+        name, run_id = key
+        run_dir = os.path.join(self.snapshot, name, f"runID={run_id}")
+        os.makedirs(run_dir, exist_ok=True)
+
+        part = self.parts.get(key, 0)
+        self.parts[key] = part + 1
+        self.schemas[name].append(schema)
+
+        return pq.ParquetWriter(os.path.join(run_dir, f"part-{part}.parquet"), schema)
+
+    def close(self):
+        """Flush all buffered rows, close the files and write the zero-row schema file of every stream"""
+
+        for key in list(self.pending):
+            self._flush(key)
+        for writer in self.writers.values():
+            writer.close()
+        self.writers.clear()
+
+        for name, schemas in self.schemas.items():
+            _write_schema(self.snapshot, name, schemas or [self.empty[name]])
+
+def _write_schema(snapshot, name, schemas):
+    """Write the zero-row schema file of a stream, widening types that differ between runs (e.g. int64 / double)"""
+
+    stream_dir = os.path.join(snapshot, name)
+    os.makedirs(stream_dir, exist_ok=True)
+
+    schema = pa.unify_schemas(schemas, promote_options="permissive")
+    pq.write_table(schema.empty_table(), os.path.join(stream_dir, SCHEMA_NAME))
+
+def _export_streams(db_file, writer):
+    """Scan every event table once in chunks and hand the stream rows to writer"""
+
+    # Imported here: ediary2_helpers dispatches its loaders to this module
+    import ediary2_helpers as ediary2
+
+    sources = [("locationEventData", 1, {900: "location"}, ediary2.LOCATION_COLUMNS),
+               ("feedbackEventData", 1, {800: "feedback"}, ediary2.FEEDBACK_COLUMNS)]
+    tables = {}
+    for sensor, (table_name, sensor_id) in ediary2.BIOHARNESS_SENSORS.items():
+        tables.setdefault(table_name, {})[sensor_id] = sensor
+    sources += [(table_name, ediary2.BIOHARNESS_PLATFORM_ID, sensors, ediary2.EVENT_COLUMNS + ["value"])
+                for table_name, sensors in tables.items()]
+
+    for table_name, platform_id, sensors, columns in sources:
+        # Streams without recordings still get a schema file with the loader's columns
+        empty = ediary2._chunk_frame([], columns)
+        for name in sensors.values():
+            writer.declare(name, empty.rename(columns={"value": name}))
+
+        where, params = ediary2._event_filter(platform_id, list(sensors))
+        for chunk in ediary2._iter_query_chunks(db_file, f'SELECT * FROM {table_name} WHERE {where}', params, columns):
+            for sensor_id, group in chunk.groupby("sensorID", sort=False):
+                writer.add(sensors[sensor_id], group.rename(columns={"value": sensors[sensor_id]}))
+
+def export_snapshot(db_file, snapshot = None):
+    """Convert an eDiary .db file into a Parquet snapshot directory and returns its path
+
+    Every event table is scanned once in chunks whose rows are routed to one Parquet writer per
+    stream and run, so memory is bounded by the buffered row groups rather than the study. The
+    snapshot is written to a private temporary directory next to the final location and moved in
+    place at the end: readers never see a half-written snapshot, and when another session (the
+    same upload) finished a current snapshot first, that one is kept and this one discarded.
+    """
+
+    # Imported here: ediary2_helpers dispatches its loaders to this module
+    import ediary2_helpers as ediary2
+
+    if snapshot is None:
+        snapshot = snapshot_path(db_file)
+
+    tmp_snapshot = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(snapshot)),
+                                    prefix=os.path.basename(snapshot) + ".tmp-")
+    try:
+        runs = ediary2.retrieve_run_data(db_file)
+        os.makedirs(os.path.join(tmp_snapshot, "run"))
+        pq.write_table(pa.Table.from_pandas(runs, preserve_index=False),
+                       os.path.join(tmp_snapshot, "run", "part-0.parquet"))
+
+        writer = _RunPartitionWriter(tmp_snapshot)
+        try:
+            _export_streams(db_file, writer)
+        finally:
+            writer.close()
+
+        with open(os.path.join(tmp_snapshot, MANIFEST_NAME), "w") as f:
+            json.dump({"source": os.path.abspath(db_file),
+                       "source_hash": ediary2_cache.file_hash(db_file),
+                       "streams": list(writer.schemas)}, f, indent=2)
+
+        _replace_snapshot(db_file, tmp_snapshot, snapshot)
+    finally:
+        if os.path.exists(tmp_snapshot):
+            shutil.rmtree(tmp_snapshot)
+
+    return snapshot
+
+def _replace_snapshot(db_file, tmp_snapshot, snapshot):
+    """Move a finished snapshot in place, unless a current one is already there (tmp_snapshot is then left as is)"""
+
+    if snapshot_is_current(db_file, snapshot):
+        return
+
+    # Rename an outdated snapshot away first: renaming a directory is atomic, deleting it is not
+    outdated = None
+    if os.path.exists(snapshot):
+        outdated = tempfile.mkdtemp(dir=os.path.dirname(tmp_snapshot), prefix=os.path.basename(snapshot) + ".old-")
+        os.replace(snapshot, outdated)
+
+    try:
+        os.replace(tmp_snapshot, snapshot)
+    except OSError:
+        # Another session moved its snapshot in first: keep that one
+        if not is_snapshot(snapshot):
+            raise
+    finally:
+        if outdated is not None:
+            shutil.rmtree(outdated, ignore_errors=True)
+
+def _stream_dataset(snapshot, name, run_id = None):
+    """Open the files of a stream (of one run) as a pyarrow dataset"""
+
+    stream_dir = os.path.join(snapshot, name)
+
+    if run_id is None:
+        files = sorted(glob.glob(os.path.join(stream_dir, "runID=*", "*.parquet")))
+    else:
+        files = sorted(glob.glob(os.path.join(stream_dir, f"runID={int(run_id)}", "*.parquet")))
+
+    # No recordings (for this run): the schema file gives an empty frame with the right dtypes
+    if not files:
+        files = [os.path.join(stream_dir, SCHEMA_NAME)]
+
+    # runID is stored in the files themselves, the directory names are only used for pruning
+    return ds.dataset(files, schema=pq.read_schema(os.path.join(stream_dir, SCHEMA_NAME)), format="parquet")
+
+def _time_filter(start = None, end = None):
+    """Dataset filter expression for a [start, end] range of Unix ms timestamps"""
+
+    expression = None
+    if start is not None:
+        expression = ds.field("timestamp") >= start
+    if end is not None:
+        upper = ds.field("timestamp") <= end
+        expression = upper if expression is None else expression & upper
+
+    return expression
+
+def read_stream(snapshot, name, run_id = None, start = None, end = None, columns = None):
+    """Read a stream from a snapshot, pruning runs by directory and times by row group statistics
+
+    :param snapshot: snapshot directory written by export_snapshot
+    :param name: location, feedback or a sensor name of ediary2_helpers.BIOHARNESS_SENSORS
+    :param run_id: only read this participant run (default: all runs)
+    :param start: only read samples at or after this time (Unix ms)
+    :param end: only read samples at or before this time (Unix ms)
+    :param columns: only read these columns (default: all)
+    :return: pd.DataFrame
+    """
+
+    dataset = _stream_dataset(snapshot, name, run_id)
+
+    return dataset.to_table(columns=columns, filter=_time_filter(start, end)).to_pandas()
+
+def iter_stream_chunks(snapshot, name, chunksize, run_id = None, start = None, end = None, columns = None):
+    """Yield a stream of a snapshot as pd.DataFrame chunks of at most chunksize rows"""
+
+    dataset = _stream_dataset(snapshot, name, run_id)
+
+    for batch in dataset.to_batches(columns=columns, filter=_time_filter(start, end), batch_size=chunksize):
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+def read_runs(snapshot, run_id = None):
+    """Read the participant runs of a snapshot and returns pd.DataFrame"""
+
+    filters = [("id", "=", int(run_id))] if run_id is not None else None
+
+    return pq.read_table(os.path.join(snapshot, "run", "part-0.parquet"), filters=filters).to_pandas()
+
+def read_run_ids(snapshot, name = "location"):
+    """List the runIDs recorded in a stream of a snapshot"""
+
+    run_dirs = glob.glob(os.path.join(snapshot, name, "runID=*"))
+
+    return sorted(int(os.path.basename(run_dir).split("=", 1)[1]) for run_dir in run_dirs)
@@ -0,0 +1,186 @@
+import numpy as np
+import pandas as pd
+
+import folium
+from folium import plugins
+
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+import ediary2_helpers
+import ediary2_geo
+
+### Downsampling of sensor time series before plotting
+
+# Points per chart sent to the browser unless configured otherwise
+DEFAULT_MAX_POINTS = 2000
+
+def lttb_indices(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: positions of n_out points that keep the visual shape of (x, y)
+
+    The first and last points are always kept; every bucket in between contributes the
+    point forming the largest triangle with the previously selected point and the
+    average of the next bucket. x must be sorted.
+    """
+
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # Bucket boundaries for the n_out - 2 inner buckets (points 1 .. n - 2)
+    every = (n - 2) / (n_out - 2)
+    edges = np.floor(np.arange(n_out - 1) * every).astype(np.int64) + 1
+    edges[-1] = n - 1
+
+    # Average point of every bucket, all at once; the last point acts as the bucket after the last one
+    counts = np.diff(edges)
+    avg_x = np.append(np.add.reduceat(x[:n - 1], edges[:-1]) / counts, x[-1])
+    avg_y = np.append(np.add.reduceat(y[:n - 1], edges[:-1]) / counts, y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for bucket in range(n_out - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        area = np.abs((x[a] - avg_x[bucket + 1]) * (y[start:stop] - y[a])
+                      - (x[a] - x[start:stop]) * (avg_y[bucket + 1] - y[a]))
+        a = start + int(np.argmax(area))
+        selected[bucket + 1] = a
+
+    return selected
+
+def minmax_indices(y, n_out):
+    """Min/max bucketing: positions of the minimum and maximum of each of n_out // 2 buckets (in order)"""
+
+    n = len(y)
+    if n_out >= n or n_out < 2:
+        return np.arange(n)
+
+    y = np.asarray(y, dtype=float)
+    n_buckets = n_out // 2
+    edges = np.linspace(0, n, n_buckets + 1).astype(np.int64)
+
+    # Pad to a (buckets x width) array so argmin/argmax run over all buckets at once
+    width = int(np.diff(edges).max())
+    positions = edges[:-1, None] + np.arange(width)
+    valid = positions < edges[1:, None]
+    values = y[np.minimum(positions, n - 1)]
+
+    lowest = positions[np.arange(n_buckets), np.argmin(np.where(valid, values, np.inf), axis=1)]
+    highest = positions[np.arange(n_buckets), np.argmax(np.where(valid, values, -np.inf), axis=1)]
+
+    return np.unique(np.concatenate([lowest, highest]))
+
+def downsample(df, y, n_out = DEFAULT_MAX_POINTS, x = "timestamp", method = "lttb"):
+    """Reduce a sensor frame to at most n_out rows for plotting and returns pd.DataFrame
+
+    :param df: sensor frame sorted by x (e.g. a retrieve_all_* result of one run)
+    :param y: value column to preserve the shape of
+    :param n_out: maximum number of rows returned
+    :param x: numeric x column used for the triangle areas (Unix ms timestamps)
+    :param method: "lttb" (Largest-Triangle-Three-Buckets) or "minmax" (min and max per bucket)
+    """
+
+    data = df.dropna(subset=[y])
+    if len(data) <= n_out:
+        return data
+
+    if method == "lttb":
+        positions = lttb_indices(data[x].to_numpy(), data[y].to_numpy(), n_out)
+    elif method == "minmax":
+        positions = minmax_indices(data[y].to_numpy(), n_out)
+    else:
+        raise ValueError(f"Unknown downsampling method: {method}")
+
+    return data.iloc[positions]
+
+
+### Combined sensor dashboard
+
+# (sensor name in BIOHARNESS_SENSORS, value column, subplot title) in display order
+DASHBOARD_CHANNELS = [
+    ("BWA", "BWA", "Breathing Wave Amplitude"),
+    ("posture", "posture", "Posture"),
+    ("heart_rate", "heart_rate", "Heart Rate"),
+    ("resp_rate", "resp_rate", "Respiration Rate"),
+    ("ecg_ampl", "ecg_ampl", "ECG Amplitude"),
+    ("ecg_noise", "ecg_noise", "ECG Noise"),
+]
+
+def sensor_dashboard(sensor_data, channels = DASHBOARD_CHANNELS, n_out = DEFAULT_MAX_POINTS, row_height = 180):
+    """Stack one WebGL line per channel in subplots sharing a single time axis and returns go.Figure
+
+    :param sensor_data: dict of sensor name -> frame (retrieve_all_sensors_data result)
+    :param channels: (sensor name, value column, title) per subplot, top to bottom
+    :param n_out: maximum number of points per channel (see downsample)
+    :param row_height: height of one subplot in pixels
+    """
+
+    channels = [channel for channel in channels if channel[0] in sensor_data]
+    fig = make_subplots(rows = max(len(channels), 1), cols = 1, shared_xaxes = True,
+                        vertical_spacing = 0.02, subplot_titles = [title for _, _, title in channels])
+
+    for row, (sensor, column, title) in enumerate(channels, start = 1):
+        data = downsample(sensor_data[sensor], column, n_out)
+        # Scattergl renders through WebGL, so zoom/pan stays responsive with many points
+        fig.add_trace(go.Scattergl(x = data["timestamp_utc"], y = data[column], mode = "lines", name = title),
+                      row = row, col = 1)
+        fig.update_yaxes(title_text = column, row = row, col = 1)
+
+    # One legend entry per subplot title is redundant; zooming any subplot moves all of them
+    fig.update_layout(height = row_height * max(len(channels), 1), showlegend = False,
+                      margin = dict(l = 60, r = 20, t = 40, b = 40))
+    fig.update_xaxes(title_text = "timestamp_utc", row = max(len(channels), 1), col = 1)
+
+    return fig
+
+### Map of a run's GPS track
+
+def create_map_with_track_and_MOS(geo_df, add_MOS: bool = False, track=None) -> folium.Map:
+    """
+    Generates a folium.Map from geopandas.GeoDataFrame
+    :param geo_df: geopandas.GeoDataFrame with lat/lon data
+    :param track: simplified track to draw (defaults to ediary2_geo.simplify_track(geo_df))
+    :return: folium.Map
+    """
+
+    if track is None:
+        track = ediary2_geo.simplify_track(geo_df)
+
+    map = folium.Map(location=[geo_df["latitude"].mean(), geo_df["longitude"].mean()], zoom_start=16, height='90%',
+                     prefer_canvas=True)
+    plugins.PolyLineOffset(track[["latitude", "longitude"]], color="blue", weight=3, opacity=0.8).add_to(map)
+
+    # Add Data and Style Map
+
+    # Markers are only drawn for high MOS scores, so without add_MOS there is nothing more to build
+    if not add_MOS:
+        return map
+
+    # TODO - replace this with MOS_score
+    marked = geo_df.loc[geo_df["MOS_score"] >= 75]
+    if marked.empty:
+        return map
+
+    # All markers go into one GeoJSON layer; the popup is templated client-side from the feature properties
+    properties = pd.DataFrame({"time": ediary2_helpers.format_utc(marked["timestamp_utc"]),
+                               "location": "(" + marked["latitude"].astype(str) + ", " + marked["longitude"].astype(str) + ")",
+                               "speed": marked["speed"].to_numpy(),
+                               "altitude": marked["altitude"].to_numpy(),
+                               "bearing": marked["bearing"].to_numpy()})
+    features = [{"type": "Feature", "geometry": {"type": "Point", "coordinates": [lon, lat]}, "properties": props}
+                for lon, lat, props in zip(marked["longitude"].tolist(), marked["latitude"].tolist(),
+                                           properties.to_dict("records"))]
+
+    folium.GeoJson({"type": "FeatureCollection", "features": features},
+                   marker=folium.Circle(radius=6, color="red", fill=True, fill_color="red"),
+                   popup=folium.GeoJsonPopup(fields=["time", "location", "speed", "altitude", "bearing"],
+                                             aliases=["Time:", "Location:", "Speed:", "Altitude:", "Bearing:"],
+                                             max_width=400)).add_to(map)
+
+    return map
@@ -0,0 +1,145 @@
+import functools
+import json
+import logging
+import os
+import time
+import tracemalloc
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import pandas as pd
+
+### Lightweight timing / memory instrumentation of loaders and render stages
+
+logger = logging.getLogger("ediary2.profiling")
+
+RECORD_COLUMNS = ["name", "kind", "started_utc", "seconds", "rows", "allocated_bytes"]
+
+# tracemalloc is process-wide (it slows down every session of the server), so memory tracing is a
+# deployment setting: EDIARY2_TRACE_MEMORY=1 traces from import on and is never stopped by a session
+TRACE_MEMORY = os.environ.get("EDIARY2_TRACE_MEMORY", "0") == "1"
+if TRACE_MEMORY:
+    tracemalloc.start()
+
+# Records of the current collection (one Streamlit rerun, one batch job, ...); None = not collecting
+_records = ContextVar("ediary2_profiling_records", default=None)
+
+def start_collecting():
+    """Collect records from here on in the current thread / context and return the (live) list of records
+
+    While tracemalloc is tracing (TRACE_MEMORY, or collect(trace_memory=True) in scripts) the bytes
+    allocated (and still held) by every call are measured; otherwise allocated_bytes stays None.
+    """
+
+    records = []
+    _records.set(records)
+    return records
+
+def stop_collecting():
+    """Stop collecting in the current context (calls run uninstrumented again)"""
+
+    _records.set(None)
+
+@contextmanager
+def collect(trace_memory = False):
+    """Collect the records of a block (tracing memory with trace_memory) --> yields the list of records
+
+    Tracing is only stopped again if this block started it.
+    """
+
+    previous = _records.get()
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+
+    records = start_collecting()
+    try:
+        yield records
+    finally:
+        _records.set(previous)
+        if started_tracing:
+            tracemalloc.stop()
+
+def _rows(result):
+    """Rows of a result: length of a frame, summed over dicts of frames, None otherwise"""
+
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return len(result)
+    if isinstance(result, dict):
+        rows = [_rows(value) for value in result.values()]
+        return sum(row for row in rows if row is not None) if any(row is not None for row in rows) else None
+    return None
+
+@contextmanager
+def stage(name, kind = "stage"):
+    """Time a block (e.g. building and rendering one panel) when collecting --> yields the record dict (set "rows" if useful)"""
+
+    records = _records.get()
+    if records is None:
+        yield {}
+        return
+
+    record = dict(name=name, kind=kind, started_utc=pd.Timestamp.now(tz="UTC").isoformat(), seconds=None, rows=None,
+                  allocated_bytes=None)
+
+    tracing = tracemalloc.is_tracing()
+    allocated = tracemalloc.get_traced_memory()[0] if tracing else None
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["seconds"] = time.perf_counter() - started
+        if tracing and tracemalloc.is_tracing():
+            record["allocated_bytes"] = tracemalloc.get_traced_memory()[0] - allocated
+        records.append(record)
+        logger.info(json.dumps(record, default=str))
+
+def profiled(function):
+    """Decorator recording wall time, rows returned and bytes allocated of every call while collecting"""
+
+    name = f"{function.__module__}.{function.__name__}"
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        # Not collecting: a single lookup of overhead
+        if _records.get() is None:
+            return function(*args, **kwargs)
+
+        with stage(name, kind="call") as record:
+            result = function(*args, **kwargs)
+            record["rows"] = _rows(result)
+        return result
+
+    return wrapper
+
+def records_frame(records):
+    """Collected records as a table and returns pd.DataFrame of RECORD_COLUMNS"""
+
+    return pd.DataFrame(records, columns=RECORD_COLUMNS).astype({"rows": "Int64", "allocated_bytes": "Int64"})
+
+def summarize(records):
+    """Calls, total / mean / max seconds, rows and allocated MB per name, slowest first, and returns pd.DataFrame"""
+
+    frame = records_frame(records)
+    grouped = frame.groupby(["name", "kind"])
+    summary = grouped.agg(calls=("seconds", "size"), total_s=("seconds", "sum"),
+                          mean_s=("seconds", "mean"), max_s=("seconds", "max"))
+
+    # Stages that do not report rows / memory stay empty instead of summing to 0
+    summary["rows"] = grouped["rows"].sum(min_count=1)
+    summary["allocated_mb"] = grouped["allocated_bytes"].sum(min_count=1) / 2**20
+    if frame["allocated_bytes"].isna().all():
+        summary = summary.drop(columns="allocated_mb")
+
+    return summary.sort_values("total_s", ascending=False).reset_index()
+
+def export_json(records, path = None):
+    """Records as a JSON array (written to path when given) --> returns str"""
+
+    text = json.dumps(records, default=str, indent=1)
+    if path is not None:
+        with open(path, "w") as f:
+            f.write(text)
+
+    return text
@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+
+import ediary2_helpers
+
+### Data quality of sensor streams: sampling intervals, gaps, duplicates and coverage
+
+# An interval counts as a gap when it is this many times longer than the stream's median interval
+DEFAULT_GAP_FACTOR = 5
+
+QUALITY_COLUMNS = ["runID", "sensor", "samples", "duplicates", "duration_s", "median_interval_s", "p95_interval_s",
+                   "max_interval_s", "gaps", "gap_s", "coverage_pct", "nominal_rate_hz", "effective_rate_hz"]
+
+GAP_COLUMNS = ["runID", "sensor", "gap_start_utc", "gap_end_utc", "gap_s"]
+
+def _sorted_intervals(df):
+    """Run ids and timestamps sorted by (runID, timestamp) plus the intervals within each run"""
+
+    runs = df["runID"].to_numpy()
+    timestamps = df["timestamp"].to_numpy(dtype=np.int64)
+
+    order = np.lexsort((timestamps, runs))
+    runs, timestamps = runs[order], timestamps[order]
+
+    same_run = runs[1:] == runs[:-1]
+    intervals = pd.DataFrame({"runID": runs[1:][same_run], "interval": np.diff(timestamps)[same_run],
+                              "start": timestamps[:-1][same_run], "end": timestamps[1:][same_run]})
+
+    return runs, timestamps, intervals
+
+def _bounds(runs, timestamps, run_bounds):
+    """First / last sample and sample count of every run, plus its start / end (run_bounds or the samples)"""
+
+    bounds = pd.DataFrame({"runID": runs, "timestamp": timestamps}).groupby("runID")["timestamp"].agg(["min", "max", "size"])
+    bounds["start"], bounds["end"] = bounds["min"], bounds["max"]
+    for run in bounds.index.intersection(list(run_bounds or {})):
+        bounds.loc[run, ["start", "end"]] = run_bounds[run]
+
+    return bounds
+
+def _gaps(intervals, bounds, gap_seconds, gap_factor):
+    """Intervals above the gap threshold (fixed gap_seconds or gap_factor x the run's median interval),
+    including missing data between the run start / end and its first / last sample"""
+
+    if gap_seconds is not None:
+        thresholds = pd.Series(gap_seconds * 1000, index=bounds.index)
+    else:
+        thresholds = (intervals.groupby("runID")["interval"].median() * gap_factor).reindex(bounds.index)
+        # Runs with fewer than 2 samples have no median interval: any missing data at their edges is a gap
+        thresholds = thresholds.fillna(0)
+
+    edges = pd.concat([pd.DataFrame({"runID": bounds.index, "start": bounds["start"].to_numpy(), "end": bounds["min"].to_numpy()}),
+                       pd.DataFrame({"runID": bounds.index, "start": bounds["max"].to_numpy(), "end": bounds["end"].to_numpy()})],
+                      ignore_index=True)
+    edges["interval"] = edges["end"] - edges["start"]
+
+    candidates = pd.concat([intervals, edges], ignore_index=True)
+    gaps = candidates[candidates["interval"] > candidates["runID"].map(thresholds).to_numpy()]
+
+    return gaps.sort_values(["runID", "start"])
+
+def find_gaps(df, sensor, gap_seconds = None, gap_factor = DEFAULT_GAP_FACTOR, run_bounds = None):
+    """Gap segments of one sensor frame (all runs in it) and returns pd.DataFrame of GAP_COLUMNS
+
+    :param df: sensor frame with runID and Unix ms timestamp columns
+    :param sensor: name reported in the sensor column
+    :param gap_seconds: fixed gap threshold (default: gap_factor x the median interval of the run)
+    :param run_bounds: runID -> (start, end) Unix ms, so missing data at the start / end of a run counts as a gap
+    """
+
+    runs, timestamps, intervals = _sorted_intervals(df)
+    gaps = _gaps(intervals, _bounds(runs, timestamps, run_bounds), gap_seconds, gap_factor)
+
+    return pd.DataFrame({"runID": gaps["runID"].to_numpy(), "sensor": sensor,
+                         "gap_start_utc": ediary2_helpers.convert_timestamps_to_utc(gaps["start"]).to_numpy(),
+                         "gap_end_utc": ediary2_helpers.convert_timestamps_to_utc(gaps["end"]).to_numpy(),
+                         "gap_s": gaps["interval"].to_numpy() / 1000}, columns=GAP_COLUMNS)
+
+def sensor_quality(df, sensor, gap_seconds = None, gap_factor = DEFAULT_GAP_FACTOR, run_bounds = None):
+    """Interval distribution, gaps, duplicates and coverage per run of one sensor frame and returns pd.DataFrame
+
+    Everything is derived from one sort and one np.diff over the frame. Coverage is the share of the
+    run (first to last sample, or run_bounds) not inside a gap; the effective rate counts distinct
+    timestamps per second of run, while the nominal rate is the inverse of the median interval.
+    """
+
+    if len(df) == 0:
+        # Runs without a single sample are one gap over their whole duration
+        duration = pd.Series({run: (end - start) / 1000 for run, (start, end) in (run_bounds or {}).items()}, dtype=float)
+        return pd.DataFrame({"runID": duration.index, "sensor": sensor, "samples": 0, "duplicates": 0,
+                             "duration_s": duration.to_numpy(), "gaps": 1, "gap_s": duration.to_numpy(),
+                             "coverage_pct": 0.0, "effective_rate_hz": 0.0}, columns=QUALITY_COLUMNS)
+
+    runs, timestamps, intervals = _sorted_intervals(df)
+    bounds = _bounds(runs, timestamps, run_bounds)
+    gaps = _gaps(intervals, bounds, gap_seconds, gap_factor)
+
+    by_run = intervals.groupby("runID")["interval"]
+    report = pd.DataFrame(index=bounds.index)
+    report["sensor"] = sensor
+    report["samples"] = bounds["size"]
+    report["duplicates"] = (intervals["interval"] == 0).groupby(intervals["runID"]).sum()
+    report["duration_s"] = (bounds["end"] - bounds["start"]) / 1000
+    report["median_interval_s"] = by_run.median() / 1000
+    report["p95_interval_s"] = by_run.quantile(0.95) / 1000
+    report["max_interval_s"] = by_run.max() / 1000
+    report["gaps"] = gaps.groupby("runID").size()
+    report["gap_s"] = gaps.groupby("runID")["interval"].sum() / 1000
+    report[["duplicates", "gaps", "gap_s"]] = report[["duplicates", "gaps", "gap_s"]].fillna(0)
+    report[["duplicates", "gaps"]] = report[["duplicates", "gaps"]].astype("int64")
+
+    duration = report["duration_s"].where(report["duration_s"] > 0)
+    report["coverage_pct"] = (100 * (1 - report["gap_s"] / duration)).clip(lower=0)
+    report["nominal_rate_hz"] = 1 / report["median_interval_s"].where(report["median_interval_s"] > 0)
+    report["effective_rate_hz"] = (report["samples"] - report["duplicates"]) / duration
+
+    return report.reset_index()[QUALITY_COLUMNS]
+
+def quality_report(sensor_data, gap_seconds = None, gap_factor = DEFAULT_GAP_FACTOR, run_bounds = None):
+    """One quality row per run x sensor for a dict of sensor frames (retrieve_all_sensors_data) and returns pd.DataFrame"""
+
+    reports = [sensor_quality(frame, sensor, gap_seconds, gap_factor, run_bounds) for sensor, frame in sensor_data.items()]
+    return pd.concat(reports, ignore_index=True) if reports else pd.DataFrame(columns=QUALITY_COLUMNS)
+
+def database_quality(db_file, sensors = None, run_id = None, gap_seconds = None, gap_factor = DEFAULT_GAP_FACTOR):
+    """Quality report of a database, reading each event table once and bounding runs by the run table, returns pd.DataFrame"""
+
+    runs = ediary2_helpers.retrieve_run_data(db_file, run_id=run_id)
+    run_bounds = {run: (start, end) for run, start, end in zip(runs["id"], runs["start"], runs["end"])}
+
+    sensor_data = ediary2_helpers.retrieve_all_sensors_data(db_file, sensors=sensors, run_id=run_id)
+    return quality_report(sensor_data, gap_seconds, gap_factor, run_bounds)
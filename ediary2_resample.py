@@ -0,0 +1,172 @@
+import numpy as np
+import pandas as pd
+
+import ediary2_helpers
+
+### Time alignment of several streams of one run on a common grid
+
+# Bookkeeping columns of the loaded frames that are never resampled
+META_COLUMNS = {"original_idx", "runID", "timestamp", "platformID", "sensorID", "timestamp_utc"}
+
+# How the samples of a column falling into one bin are combined (columns not listed:
+# "mean" for numbers, "last" for anything else)
+AGGREGATIONS = {
+    "BWA": "mean",
+    "ecg_ampl": "mean",
+    "ecg_noise": "mean",
+    "resp_rate": "mean",
+    "vector_mag_u": "mean",
+    "peak_acc": "max",
+    "acc_min_x": "min",
+    "acc_min_y": "min",
+    "acc_min_z": "min",
+    "acc_peak_x": "max",
+    "acc_peak_y": "max",
+    "acc_peak_z": "max",
+    "heart_rate": "mean",
+    "posture": "mode",
+    "color": "mode",
+    "worn_status": "mode",
+    "battery": "last",
+}
+
+RULES = ["mean", "sum", "min", "max", "count", "first", "last", "mode", "asof"]
+
+def _bin_aggregate(bins, values, n_bins, how):
+    """Combine values per bin (bins sorted ascending, values numeric without NaN) --> returns np.ndarray of n_bins"""
+
+    out = np.full(n_bins, np.nan)
+    if len(bins) == 0:
+        return np.zeros(n_bins) if how == "count" else out
+
+    bin_ids, starts = np.unique(bins, return_index=True)
+    stops = np.append(starts[1:], len(bins))
+
+    if how == "mean":
+        out[bin_ids] = np.add.reduceat(values, starts) / (stops - starts)
+    elif how == "sum":
+        out[bin_ids] = np.add.reduceat(values, starts)
+    elif how == "min":
+        out[bin_ids] = np.minimum.reduceat(values, starts)
+    elif how == "max":
+        out[bin_ids] = np.maximum.reduceat(values, starts)
+    elif how == "count":
+        out = np.zeros(n_bins)
+        out[bin_ids] = stops - starts
+    elif how == "first":
+        out[bin_ids] = values[starts]
+    elif how == "last":
+        out[bin_ids] = values[stops - 1]
+    elif how == "mode":
+        # Runs of equal (bin, value) after sorting; per bin the longest run wins (ties: smallest value)
+        order = np.lexsort((values, bins))
+        b, v = bins[order], values[order]
+        run_starts = np.flatnonzero(np.r_[True, (b[1:] != b[:-1]) | (v[1:] != v[:-1])])
+        run_counts = np.diff(np.append(run_starts, len(b)))
+        best = np.lexsort((v[run_starts], -run_counts, b[run_starts]))
+        run_bins = b[run_starts][best]
+        first_of_bin = np.r_[True, run_bins[1:] != run_bins[:-1]]
+        out[run_bins[first_of_bin]] = v[run_starts][best][first_of_bin]
+    else:
+        raise ValueError(f"Unknown aggregation rule: {how} (expected one of {RULES})")
+
+    return out
+
+def resample_column(timestamps, values, grid, step, how = "mean", tolerance_ms = None):
+    """Resample one column onto a regular grid of Unix ms bin starts --> returns np.ndarray (object for text columns)
+
+    Samples in [grid[i], grid[i] + step) are combined with the rule how. "asof" instead takes the
+    latest sample at or before each bin start (sorted merge_asof), optionally no older than tolerance_ms,
+    which suits sparse streams such as feedback or battery.
+    """
+
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    values = pd.Series(values).reset_index(drop=True)
+
+    if how == "asof":
+        samples = pd.DataFrame({"timestamp": timestamps, "value": values}).dropna().sort_values("timestamp", kind="stable")
+        aligned = pd.merge_asof(pd.DataFrame({"timestamp": np.asarray(grid, dtype=np.int64)}), samples, on="timestamp",
+                                direction="backward", tolerance=tolerance_ms)
+        return aligned["value"].to_numpy()
+
+    # A stream without samples (e.g. no chest strap in a phone-only run) is simply missing on the grid
+    if len(values) == 0:
+        return np.zeros(len(grid)) if how == "count" else np.full(len(grid), np.nan)
+
+    numeric = pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values)
+    if not numeric and how not in ("first", "last", "mode", "count"):
+        raise ValueError(f"Aggregation rule {how} needs a numeric column")
+
+    # Text columns are aggregated as category codes and mapped back afterwards
+    if numeric:
+        codes, categories = values.to_numpy(dtype=float), None
+    else:
+        codes, categories = pd.factorize(values)
+        codes = np.where(codes < 0, np.nan, codes).astype(float)
+
+    valid = ~np.isnan(codes)
+    bins = (timestamps[valid] - grid[0]) // step
+    codes = codes[valid]
+    inside = (bins >= 0) & (bins < len(grid))
+    bins, codes = bins[inside], codes[inside]
+
+    # Loaded frames are time-sorted already; only sort (stable, O(N log N)) when they are not
+    if np.any(bins[1:] < bins[:-1]):
+        order = np.argsort(bins, kind="stable")
+        bins, codes = bins[order], codes[order]
+
+    out = _bin_aggregate(bins, codes, len(grid), how)
+    if categories is None or how == "count":
+        return out
+
+    result = np.full(len(out), None, dtype=object)
+    present = ~np.isnan(out)
+    result[present] = np.asarray(categories)[out[present].astype(np.int64)]
+    return result
+
+def resample_run(streams, freq = "1s", rules = None, columns = None, start = None, end = None, asof_tolerance = None):
+    """Align several streams of one run into one wide frame indexed by UTC bin start and returns pd.DataFrame
+
+    :param streams: dict of stream name -> frame with a Unix ms "timestamp" column (e.g. EDiaryDataset.sensors(),
+                    .location, .feedback); every frame must hold a single run
+    :param freq: bin width as a pandas offset/timedelta string, e.g. "1s", "10s", "1min"
+    :param rules: aggregation rule per output column, overriding AGGREGATIONS (see RULES)
+    :param columns: dict of stream name -> columns to resample (default: all but the META_COLUMNS)
+    :param start: first bin (Unix ms or datetime, default: earliest sample)
+    :param end: last bin (Unix ms or datetime, default: latest sample)
+    :param asof_tolerance: oldest sample (as a timedelta string) an "asof" column may carry forward
+    """
+
+    rules = {**AGGREGATIONS, **(rules or {})}
+    columns = columns or {}
+
+    for name, frame in streams.items():
+        if frame["runID"].nunique() > 1:
+            raise ValueError(f"resample_run expects the frames of one run, {name} holds {frame['runID'].nunique()}")
+
+    selected = {name: columns.get(name, [column for column in frame.columns if column not in META_COLUMNS])
+                for name, frame in streams.items()}
+
+    # Prefix a column with its stream name when several streams have it (e.g. latitude of location and feedback)
+    counts = pd.Series([column for names in selected.values() for column in names]).value_counts()
+
+    step = int(pd.Timedelta(freq) / pd.Timedelta(milliseconds=1))
+    first = [frame["timestamp"].min() for frame in streams.values() if len(frame)]
+    last = [frame["timestamp"].max() for frame in streams.values() if len(frame)]
+    start = ediary2_helpers._to_epoch_ms(start) if start is not None else (min(first) if first else 0)
+    end = ediary2_helpers._to_epoch_ms(end) if end is not None else (max(last) if last else start)
+    origin = start - start % step
+    grid = np.arange(origin, end + 1, step, dtype=np.int64)
+
+    tolerance = int(pd.Timedelta(asof_tolerance) / pd.Timedelta(milliseconds=1)) if asof_tolerance is not None else None
+
+    wide = {}
+    for name, frame in streams.items():
+        timestamps = frame["timestamp"].to_numpy()
+        for column in selected[name]:
+            how = rules.get(column, "mean" if pd.api.types.is_numeric_dtype(frame[column]) else "last")
+            output = column if counts[column] == 1 else f"{name}_{column}"
+            wide[output] = resample_column(timestamps, frame[column], grid, step, how, tolerance)
+
+    index = pd.DatetimeIndex(pd.to_datetime(grid, unit="ms", utc=True), name="timestamp_utc")
+    return pd.DataFrame(wide, index=index)
@@ -0,0 +1,215 @@
+"""Generate synthetic eDiary 2.0 databases with the schema and sensor codes the loaders expect
+
+    python ediary2_synthetic.py synthetic.db --participants 3 --duration 1d
+"""
+
+import argparse
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+import ediary2_helpers
+
+SCHEMA = """
+CREATE TABLE run (id INTEGER PRIMARY KEY, start INTEGER, "end" INTEGER, study TEXT, name TEXT, birthYear INTEGER,
+                  gender TEXT, email TEXT, note TEXT, configurationId INTEGER, appVersion TEXT, androidSdk INTEGER,
+                  device TEXT);
+CREATE TABLE doubleEventData (id INTEGER PRIMARY KEY, runId INTEGER, timestamp INTEGER, platformId INTEGER,
+                              sensorId INTEGER, value REAL);
+CREATE TABLE longEventData (id INTEGER PRIMARY KEY, runId INTEGER, timestamp INTEGER, platformId INTEGER,
+                            sensorId INTEGER, value INTEGER);
+CREATE TABLE locationEventData (id INTEGER PRIMARY KEY, runId INTEGER, timestamp INTEGER, platformId INTEGER,
+                                sensorId INTEGER, latitude REAL, longitude REAL, altitude REAL, mslAltitude REAL,
+                                bearing REAL, speed REAL, locationAccuracy REAL, bearingAccuracy REAL,
+                                speedAccuracy REAL, mslAltitudeAccuracy REAL, verticalAccuracy REAL);
+CREATE TABLE feedbackEventData (id INTEGER PRIMARY KEY, runId INTEGER, feelingDefinitionId INTEGER,
+                                causeDefinitionId INTEGER, feelingDescription TEXT, causeDescription TEXT,
+                                intensity INTEGER, note TEXT, timestamp INTEGER, latitude REAL, longitude REAL,
+                                altitude REAL, mslAltitude REAL, bearing REAL, speed REAL, locationAccuracy REAL,
+                                bearingAccuracy REAL, speedAccuracy REAL, mslAltitudeAccuracy REAL,
+                                verticalAccuracy REAL, platformId INTEGER, sensorId INTEGER);
+"""
+
+# Platform / sensor codes of the phone streams (BioHarness codes come from ediary2_helpers)
+LOCATION_PLATFORM_ID, LOCATION_SENSOR_ID = 1, 900
+FEEDBACK_PLATFORM_ID, FEEDBACK_SENSOR_ID = 1, 800
+
+FEELINGS = [(1, "calm"), (2, "stressed"), (3, "happy"), (4, "tired")]
+CAUSES = [(1, "traffic"), (2, "noise"), (3, "crowd"), (4, "other")]
+
+# Timestamps are generated and inserted in blocks of this many seconds to bound memory for week-long runs
+BLOCK_SECONDS = 3600
+
+START_MS = 1_700_000_000_000
+
+def parse_duration(value):
+    """Seconds of a duration such as 3600, "1h", "1d" or "1w" (pandas timedelta syntax)"""
+
+    if str(value).isdigit():
+        return int(value)
+    return int(pd.Timedelta(str(value).replace("w", "W")).total_seconds())
+
+def _dropout_mask(rng, seconds, dropouts_per_hour):
+    """True for the seconds with data; a few bursts of 5-120 s are missing"""
+
+    keep = np.ones(seconds, dtype=bool)
+    for _ in range(rng.poisson(dropouts_per_hour * seconds / 3600)):
+        start = rng.integers(0, seconds)
+        keep[start:start + rng.integers(5, 121)] = False
+
+    return keep
+
+def _bioharness_values(rng, n, state):
+    """One block of plausible 1 Hz BioHarness summary values per sensor name, continuing state"""
+
+    hr = np.clip(state["heart_rate"] + np.cumsum(rng.normal(0, 0.8, n)), 45, 180)
+    state["heart_rate"] = hr[-1]
+    phase = state["phase"] + np.arange(n) * 2 * np.pi / 4
+    state["phase"] = phase[-1]
+
+    values = {
+        "BWA": 200 + 80 * np.sin(phase) + rng.normal(0, 10, n),
+        "ecg_ampl": np.abs(rng.normal(0.004, 0.001, n)),
+        "ecg_noise": np.abs(rng.normal(0.0005, 0.0002, n)),
+        "resp_rate": np.clip(rng.normal(16, 2, n), 6, 40),
+        "vector_mag_u": np.abs(rng.normal(0.1, 0.05, n)),
+        "peak_acc": np.abs(rng.normal(0.3, 0.1, n)),
+        "heart_rate": np.rint(hr),
+        "posture": np.rint(np.clip(rng.normal(10, 20, n), -180, 180)),
+        "color": rng.choice([0, 1, 2], n, p=[0.8, 0.15, 0.05]),
+        "worn_status": (rng.random(n) > 0.01).astype(np.int64),
+        "battery": np.full(n, state["battery"]) - np.arange(n) // 600,
+    }
+    state["battery"] = max(values["battery"][-1], 5)
+    values["battery"] = np.maximum(values["battery"], 5)
+
+    for axis in ediary2_helpers.ACC_AXES["acc_min"]:
+        values[axis] = rng.normal(-0.5, 0.2, n)
+    for axis in ediary2_helpers.ACC_AXES["acc_peak"]:
+        values[axis] = rng.normal(0.5, 0.2, n)
+
+    return values
+
+def _track(rng, n, state):
+    """One block of a 1 Hz walking / cycling GPS track, continuing state"""
+
+    bearing = (state["bearing"] + np.cumsum(rng.normal(0, 5, n))) % 360
+    speed = np.clip(state["speed"] + np.cumsum(rng.normal(0, 0.1, n)), 0, 8)
+    north = np.cos(np.radians(bearing)) * speed
+    east = np.sin(np.radians(bearing)) * speed
+
+    latitude = state["latitude"] + np.cumsum(north) / 111_320
+    longitude = state["longitude"] + np.cumsum(east) / (111_320 * np.cos(np.radians(state["latitude"])))
+    state.update(latitude=latitude[-1], longitude=longitude[-1], bearing=bearing[-1], speed=speed[-1])
+
+    altitude = 400 + rng.normal(0, 2, n)
+    return {"latitude": latitude, "longitude": longitude, "altitude": altitude, "mslAltitude": altitude - 48,
+            "bearing": bearing, "speed": speed,
+            "locationAccuracy": rng.choice([3.0, 5.0, 10.0, 40.0, 80.0], n, p=[0.4, 0.3, 0.2, 0.07, 0.03]),
+            "bearingAccuracy": np.full(n, 10.0), "speedAccuracy": np.full(n, 0.5),
+            "mslAltitudeAccuracy": np.full(n, 3.0), "verticalAccuracy": np.full(n, 3.0)}
+
+def _insert_run(conn, rng, run_id, start_ms, duration_s, feedback_every_s, dropouts_per_hour):
+    """Insert the run row and all event rows of one participant"""
+
+    conn.execute("INSERT INTO run VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                 (run_id, start_ms, start_ms + duration_s * 1000, "synthetic", f"participant_{run_id}",
+                  int(rng.integers(1950, 2005)), str(rng.choice(["f", "m", "d"])), f"p{run_id}@example.org", "",
+                  1, "2.0", 33, "synthetic"))
+
+    double_sensors = [name for name, (table, _) in ediary2_helpers.BIOHARNESS_SENSORS.items() if table == "doubleEventData"]
+    long_sensors = [name for name, (table, _) in ediary2_helpers.BIOHARNESS_SENSORS.items() if table == "longEventData"]
+
+    harness_keep = _dropout_mask(rng, duration_s, dropouts_per_hour)
+    gps_keep = _dropout_mask(rng, duration_s, dropouts_per_hour)
+    state = {"heart_rate": 75.0, "phase": 0.0, "battery": 100, "latitude": 47.8095, "longitude": 13.0550,
+             "bearing": 90.0, "speed": 1.4}
+
+    for block_start in range(0, duration_s, BLOCK_SECONDS):
+        seconds = np.arange(block_start, min(block_start + BLOCK_SECONDS, duration_s))
+        timestamps = start_ms + seconds * 1000
+        values = _bioharness_values(rng, len(seconds), state)
+        track = _track(rng, len(seconds), state)
+
+        # Sensors of one timestamp are interleaved like the device logs them
+        keep = harness_keep[seconds]
+        for table, sensors, cast in (("doubleEventData", double_sensors, float), ("longEventData", long_sensors, int)):
+            codes = np.array([ediary2_helpers.BIOHARNESS_SENSORS[name][1] for name in sensors])
+            stacked = np.column_stack([values[name] for name in sensors])[keep]
+            present = np.ones(stacked.shape, dtype=bool)
+            if table == "doubleEventData":
+                # The z axes of the accelerometer are occasionally missing
+                present[:, [sensors.index(axis) for axis in ("acc_min_z", "acc_peak_z")]] = rng.random((len(stacked), 2)) > 0.02
+            rows = zip(np.repeat(timestamps[keep], len(sensors))[present.ravel()].tolist(),
+                       np.tile(codes, len(stacked))[present.ravel()].tolist(),
+                       stacked.ravel()[present.ravel()].astype(cast).tolist())
+            conn.executemany(f"INSERT INTO {table} (runId, timestamp, platformId, sensorId, value) "
+                             f"VALUES ({run_id}, ?, {ediary2_helpers.BIOHARNESS_PLATFORM_ID}, ?, ?)", rows)
+
+        keep = gps_keep[seconds]
+        columns = list(track)
+        conn.executemany(f"INSERT INTO locationEventData (runId, timestamp, platformId, sensorId, {', '.join(columns)}) "
+                         f"VALUES ({run_id}, ?, {LOCATION_PLATFORM_ID}, {LOCATION_SENSOR_ID}, {', '.join('?' * len(columns))})",
+                         zip(timestamps[keep].tolist(), *(track[column][keep].tolist() for column in columns)))
+
+        # Feedback at roughly every feedback_every_s seconds, at the participant's position
+        asked = np.flatnonzero(rng.random(len(seconds)) < 1 / feedback_every_s)
+        for i in asked.tolist():
+            feeling, cause = FEELINGS[rng.integers(len(FEELINGS))], CAUSES[rng.integers(len(CAUSES))]
+            conn.execute("INSERT INTO feedbackEventData (runId, feelingDefinitionId, causeDefinitionId, feelingDescription, "
+                         "causeDescription, intensity, note, timestamp, latitude, longitude, altitude, mslAltitude, bearing, "
+                         "speed, locationAccuracy, bearingAccuracy, speedAccuracy, mslAltitudeAccuracy, verticalAccuracy, "
+                         "platformId, sensorId) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                         (run_id, feeling[0], cause[0], feeling[1], cause[1], int(rng.integers(1, 6)), "",
+                          int(timestamps[i]), *(float(track[column][i]) for column in columns),
+                          FEEDBACK_PLATFORM_ID, FEEDBACK_SENSOR_ID))
+
+def generate_database(path, participants = 2, duration_s = 3600, feedback_every_s = 900, dropouts_per_hour = 1.0,
+                      seed = 0):
+    """Write a synthetic eDiary database with participants runs of duration_s seconds each and return its path
+
+    BioHarness summaries (all sensors of BIOHARNESS_SENSORS), GPS fixes and feedback are generated
+    at 1 Hz with occasional dropouts, so loaders, maps, charts and quality checks see realistic data.
+    An existing file at path is replaced.
+    """
+
+    if os.path.exists(path):
+        os.remove(path)
+
+    rng = np.random.default_rng(seed)
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF;")
+        conn.execute("PRAGMA synchronous = OFF;")
+        conn.executescript(SCHEMA)
+
+        for run_id in range(1, participants + 1):
+            _insert_run(conn, rng, run_id, START_MS + (run_id - 1) * (duration_s + 86_400) * 1000, duration_s,
+                        feedback_every_s, dropouts_per_hour)
+            conn.commit()
+    finally:
+        conn.close()
+
+    return path
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic eDiary 2.0 database.")
+    parser.add_argument("path", help="output .db file (replaced if it exists)")
+    parser.add_argument("-p", "--participants", type=int, default=2, help="number of runs")
+    parser.add_argument("-d", "--duration", default="1h", help="duration of each run, e.g. 3600, 1h, 1d, 1w")
+    parser.add_argument("--feedback-every", type=int, default=900, help="mean seconds between feedback entries")
+    parser.add_argument("--dropouts-per-hour", type=float, default=1.0, help="mean number of recording dropouts per hour")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+
+    return parser.parse_args(argv)
+
+def main(argv = None):
+    args = parse_args(argv)
+    generate_database(args.path, args.participants, parse_duration(args.duration), args.feedback_every,
+                      args.dropouts_per_hour, args.seed)
+    print(f"Wrote {args.path} ({os.path.getsize(args.path) / 2**20:.1f} MB)")
+
+if __name__ == "__main__":
+    main()
@@ -1,244 +1,65 @@
 import streamlit as st
 from streamlit_folium import st_folium
-import folium
-from folium import plugins
 
-import sqlite3
-import pathlib
 import os
 import pandas as pd
 import math
-import datetime
 from io import BytesIO
 import random
 import time
 
-import plotly.express as px
 import plotly.graph_objects as go
 
 import ediary2_helpers as ediary2
-
-from datetime import datetime, timezone
-
-def create_map_with_track_and_MOS(geo_df, add_MOS: bool = False) -> folium.Map:
-    """
-    Generates a folium.Map from geopandas.GeoDataFrame
-    :param geo_df: geopandas.GeoDataFrame with lat/lon data
-    :return: folium.Map
-    """
-
-    map = folium.Map(location=[geo_df["latitude"].mean(), geo_df["longitude"].mean()], zoom_start=16, height='90%',
-                     prefer_canvas=True)
-    plugins.PolyLineOffset(geo_df[["latitude", "longitude"]], color="blue", weight=3, opacity=0.8).add_to(map)
-
-    # Add Data and Style Map
-
-    # MarkerCluster feature in Folium to aggregate nearby markers together when the map is zoomed out.
-
-    # for loop below configures a popup, styles the Plaque marker, and adds the feature to the MarkerCluster layer.
-
-    # Create a marker for each plaque location. Format popup
-
-    for index, row in geo_df.iterrows():
-
-        html = f"""<strong>Time:</strong> {row['timestamp_utc']}<br>
-
-            <br>
-
-            <strong>Location:</strong> ({row['latitude'], row['longitude']})<br>
-
-            <br>
-
-            <strong>Speed:</strong> {row['speed']}<br>
-
-            <br>
-
-            <strong>Altitude:</strong> {row['altitude']}<br>
-
-            <br>
-
-            <strong>Altitude:</strong> {row['bearing']}<br>
-
-                """
-
-        iframe = folium.IFrame(html,
-
-                               width=200,
-
-                               height=200)
-
-        popup = folium.Popup(iframe,
-
-                             max_width=400)
-
-        # TODO - replace this with MOS_score
-
-        ###
-
-        if add_MOS and row["MOS_score"] >= 75:
-            folium.Circle(location=[row["latitude"], row["longitude"]],
-
-                          radius=6,
-
-                          color="red",
-
-                          fill=True,
-
-                          fill_color="red",
-
-                          popup=popup).add_to(map)
-
-    return map
-
-# Convert Unix timestamp (in ms) to UTC datetime string (with ms precision)
-
-def convert_to_utc(ts_ms):
-    dt = datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc)
-    return dt.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3] + ' UTC'  # Trim to milliseconds
-
-
-
-def save_uploadedfile(uploaded_file, path: str):
-    with open(os.path.join(path, uploaded_file.name), "wb") as f:
-        f.write(uploaded_file.getbuffer())
-    return st.success("Saved file: {} to {}".format(uploaded_file.name, path))
-
-def retrieve_feedback_data(db_file, table_name = 'feedbackEventData'):
-    """Retrieve survey feedback from .db file and returns pd.DataFrame"""
-
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-    
-    # Retrieve all data from the specified table
-    #cursor.execute(f"SELECT * FROM {table_name}")
-
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {1} AND ' \
-                    f'sensorId = {800}')
-    
-    # Fetch all rows from the table
-    data = cursor.fetchall()
-
-    
-    # Print the data
-    #print(f"\nData from table: {table_name}")
-    #for row in rows:
-    #    print(row)
-    
-    # Close the connection
-    conn.close()
-
-    df = pd.DataFrame(data, columns=["original_idx", "runID", "feelingDefinitionId", "causeDefinitionId",
-                                     "feelingDescription", "causeDescription", "intensity", "note",
-                                     "timestamp",  
-                                     "latitude", "longitude", "altitude", "mslAltitude", "bearing", "speed", 
-                                     "locationAccuracy", "bearingAccuracy", "speedAccuracy",
-                                     "mslAltitudeAccuracy", "verticalAccuracy",
-                                     "platformID", "sensorID"
-                                     ])
-    
-    df['timestamp_utc'] = df['timestamp'].apply(convert_to_utc)
-
-    return df
-
-def retrieve_location_data(db_file, table_name = 'locationEventData'):
-    """Retrieve location from .db file and returns pd.DataFrame"""
-
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-
-    cursor.execute(f'SELECT * FROM {table_name} ' \
-                    f'WHERE platformId = {1} AND ' \
-                    f'sensorId = {900}')
-    
-    # Fetch all rows from the table
-    data = cursor.fetchall()
-    
-    # Close the connection
-    conn.close()
-
-    df = pd.DataFrame(data, columns=["original_idx", "runID", "timestamp", "platformID", "sensorID", 
-                                     "latitude", "longitude", "altitude", "mslAltitude", "bearing", "speed", 
-                                     "locationAccuracy", "bearingAccuracy", "speedAccuracy",
-                                     "mslAltitudeAccuracy", "verticalAccuracy"])
-    
-    df['timestamp_utc'] = df['timestamp'].apply(convert_to_utc)
-
-    return df
-
-
-def retrieve_run_data(db_file, table_name = 'run'):
-    """Retrieve participant run information from .db file and returns pd.DataFrame"""
-
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-
-    cursor.execute(f'SELECT * FROM {table_name} ')# \
-                    #f'WHERE platformId = {1} AND ' \
-                    #f'sensorId = {900}')
-    
-    # Fetch all rows from the table
-    data = cursor.fetchall()
-    
-    # Close the connection
-    conn.close()
-
-    df = pd.DataFrame(data, columns=["id", "start", "end", "study", 
-                                     "name", "birthYear", "gender", "email", "note", "configurationID", 
-                                     "appVersion", "androidSdk", "device"])
-    
-    df['timestamp_start_utc'] = df['start'].apply(convert_to_utc)
-    df['timestamp_end_utc'] = df['end'].apply(convert_to_utc)
-
-    return df[["id", "name", "study", "timestamp_start_utc", "timestamp_end_utc", 
-                "birthYear", "gender", "email", "note", "start", "end", 
-                "configurationID", "appVersion", "androidSdk", "device"]]
-
-# Function to print the schema of the database
-def print_schema(db_file):
-    """Retrieve all tables in .db file and print their schema"""
-
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_file)
-    
-    # Create a cursor object to interact with the database
-    cursor = conn.cursor()
-    
-    # Get the schema of the database
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    
-    # Fetch all the table names
-    tables = cursor.fetchall()
-    
-    # Print schema for each table
-    for table in tables:
-        print(f"Schema for table: {table[0]}")
-        cursor.execute(f"PRAGMA table_info({table[0]});")
-        
-        # Fetch and print column details for the current table
-        columns = cursor.fetchall()
-        for column in columns:
-            print(f"Column Name: {column[1]}, Type: {column[2]}, Not Null: {column[3]}, Default Value: {column[4]}")
-        print("-" * 40)
-    
-    # Close the connection
-    conn.close()
-
-    return tables
-
+import ediary2_db
+import ediary2_cache
+import ediary2_catalog
+import ediary2_parquet
+import ediary2_plotting
+import ediary2_geo
+import ediary2_dataset
+import ediary2_resample
+import ediary2_quality
+import ediary2_features
+import ediary2_profiling
+
+from datetime import timedelta
+
+def save_uploadedfile(uploaded_file, create_indexes: bool = False):
+    """Store the upload once per content hash (as an indexed copy on request) and return the .db path"""
+
+    # Streamlit reruns the whole script on every interaction: only hash, store (and index) each upload once
+    saved_key = (uploaded_file.file_id, create_indexes)
+    saved = st.session_state.get("saved_upload")
+    if saved is not None and saved[0] == saved_key and os.path.exists(saved[1]):
+        return saved[1]
+
+    db_file, digest = ediary2_db.ingest_upload(uploaded_file.getbuffer())
+    ediary2_cache.remember_file_hash(db_file, digest)
+
+    st.session_state["index_report"] = None
+    if create_indexes:
+        def build_indexes(db_copy):
+            st.session_state["index_report"] = ediary2.create_event_indexes(db_copy)
+        db_file, _ = ediary2_db.derived_copy(db_file, "indexed", build_indexes)
+
+    st.session_state["saved_upload"] = (saved_key, db_file)
+    st.success("Saved file: {} to {}".format(uploaded_file.name, db_file))
+
+    return db_file
 
 st.header("Select an eDiary2.0 database file (.db extension):")
 
-path = pathlib.Path(__file__).parent.resolve()
+# Optionally time every loader and panel of this rerun (shown in the "Performance" sidebar panel)
+profile_session = st.sidebar.checkbox("Performance panel")
+if profile_session:
+    # Memory tracing is process-wide, i.e. a deployment setting (EDIARY2_TRACE_MEMORY) rather than per session
+    st.sidebar.write("Memory tracing: ", "on" if ediary2_profiling.TRACE_MEMORY else "off")
+    profile_records = ediary2_profiling.start_collecting()
+else:
+    profile_records = None
+    ediary2_profiling.stop_collecting()
+
 st.markdown("---")
 
 ######## File uploader ########
@@ -249,34 +70,60 @@ st.info("Upload .sqlite files")
 # the main, branching part of the application
 if uploaded_db_file is not None:
     try:
-        save_uploadedfile(uploaded_file=uploaded_db_file, path=path)
-        st.write(f"Saving file {uploaded_db_file} to: {path}")
+        create_indexes = st.sidebar.checkbox("Index database on upload (faster queries, larger file)")
+
+        db_file = save_uploadedfile(uploaded_file=uploaded_db_file, create_indexes=create_indexes)
+
+        if st.session_state.get("index_report") is not None:
+            index_report = st.session_state["index_report"]
+            st.sidebar.write("Index build time (s): ", index_report["seconds"].sum())
+            st.sidebar.write("Index size (MB): ", index_report["size_bytes"].sum() / 2**20)
+            with st.expander("Database indexes"):
+                st.write(index_report)
+
+        # Schema, row counts and recorded sensors, built with one aggregate pass per file version
+        catalog = ediary2_catalog.get_catalog(db_file)
+        with st.expander("Database catalog"):
+            st.write(catalog["tables"])
+            st.write(ediary2_catalog.sensor_overview(db_file))
+            st.write(catalog["columns"])
         
         st.sidebar.title("Select Participant and display information")
 
-        run_data = retrieve_run_data(os.path.join(path, uploaded_db_file.name))
-        run_data["timestamp_start_utc"] = pd.to_datetime(run_data["timestamp_start_utc"])
-        run_data["timestamp_end_utc"] = pd.to_datetime(run_data["timestamp_end_utc"])
+        # Loader results are cached on the file's content hash, so reruns only re-read what changed. The cache is
+        # shared by every session of the server process: its budget is a deployment setting (EDIARY2_CACHE_MB)
+        st.sidebar.write("Result cache budget (MB): ", ediary2_cache.RESULT_CACHE.max_bytes // 2**20)
+
+        # Optionally read from a columnar Parquet snapshot of the database (converted once per file version)
+        db_source = db_file
+        if st.sidebar.checkbox("Load from Parquet snapshot:"):
+            snapshot = ediary2_parquet.snapshot_path(db_source)
+            if not ediary2_parquet.snapshot_is_current(db_source, snapshot):
+                with st.spinner("Converting database to Parquet..."):
+                    ediary2_parquet.export_snapshot(db_source, snapshot)
+            db_source = snapshot
+
+        # Streams are only read when a panel below first uses them
+        dataset = ediary2_dataset.EDiaryDataset(db_source)
+        run_data = dataset.run_data
         st.write(run_data)
 
-        location_data = retrieve_location_data(os.path.join(path, uploaded_db_file.name))
-        location_data["timestamp_utc"] = pd.to_datetime(location_data["timestamp_utc"])
-
         participant_id_selection = st.sidebar.selectbox(
                     "Select participant ID:",
-                    set(list(location_data["runID"].unique()))
+                    dataset.run_ids
                     #("Email", "Home phone", "Mobile phone"),
                 )
 
         st.write("You selected:", participant_id_selection)
 
         st.header("Participant Run information")
-        participant_run_data = run_data[run_data["id"] == participant_id_selection].reset_index()
+        participant_run_data = dataset.run_frame("run_data", participant_id_selection).reset_index()
         st.write(participant_run_data)
 
         run_duration = participant_run_data["timestamp_end_utc"][0] - participant_run_data["timestamp_start_utc"][0]
         st.write("Run duration: ", run_duration)
-        st.sidebar.write("Run duration in seconds: ", run_duration.seconds)
+        st.sidebar.write("Run duration in seconds: ", run_duration.total_seconds())
+        st.sidebar.write("Cached results (MB): ", ediary2_cache.RESULT_CACHE.current_bytes / 2**20)
         
 
         ######### Optional eDiary Tables Display #########
@@ -285,117 +132,114 @@ if uploaded_db_file is not None:
         location_data_display = st.sidebar.checkbox("Display Locations:")
         feedback_data_display = st.sidebar.checkbox("Display Feedback:")
         sensor_data_display = st.sidebar.checkbox("Display Sensor Data:")
-
+        aligned_data_display = st.sidebar.checkbox("Display Aligned Data:")
+
+        # Charts are downsampled to this many points; narrowing the time range re-reads it at full resolution
+        max_chart_points = st.sidebar.number_input("Max points per chart:", min_value=100, step=500,
+                                                   value=ediary2_plotting.DEFAULT_MAX_POINTS)
+
+        run_start = participant_run_data["timestamp_start_utc"][0].tz_convert(None).to_pydatetime()
+        run_end = participant_run_data["timestamp_end_utc"][0].tz_convert(None).to_pydatetime()
+        chart_range = (run_start, run_end)
+        if run_end > run_start:
+            chart_range = st.sidebar.slider("Chart time range (UTC):", min_value=run_start, max_value=run_end,
+                                            value=(run_start, run_end), step=timedelta(seconds=1),
+                                            format="YYYY-MM-DD HH:mm:ss")
+
+        # The full run is loaded (and cached) without time bounds, a zoomed range only reads that window
+        chart_start, chart_end = chart_range if chart_range != (run_start, run_end) else (None, None)
         
-        breathing_wave_amplitude = ediary2.retrieve_all_bwa_data(os.path.join(path, uploaded_db_file.name), table_name='doubleEventData')
-        breathing_wave_amplitude["timestamp_utc"] = pd.to_datetime(breathing_wave_amplitude["timestamp_utc"])
-
-        posture = ediary2.retrieve_all_posture_data(os.path.join(path, uploaded_db_file.name), table_name = 'longEventData')
-        posture["timestamp_utc"] = pd.to_datetime(posture["timestamp_utc"])
-
-        heart_rate = ediary2.retrieve_all_heart_rate_data(os.path.join(path, uploaded_db_file.name), table_name="longEventData")
-        heart_rate["timestamp_utc"] = pd.to_datetime(heart_rate["timestamp_utc"])
-
-        resp_rate = ediary2.retrieve_all_resp_rate_data(os.path.join(path, uploaded_db_file.name), table_name="doubleEventData")
-        resp_rate["timestamp_utc"] = pd.to_datetime(resp_rate["timestamp_utc"])
-
-        ecg_amplitude = ediary2.retrieve_all_ecg_amplitude_data(os.path.join(path, uploaded_db_file.name), table_name='doubleEventData')
-        ecg_amplitude["timestamp_utc"] = pd.to_datetime(ecg_amplitude["timestamp_utc"])
-
-        ecg_noise = ediary2.retrieve_all_ecg_noise_data(os.path.join(path, uploaded_db_file.name), table_name='doubleEventData')
-        ecg_noise["timestamp_utc"] = pd.to_datetime(ecg_noise["timestamp_utc"])
-
-        #st.write(location_data[location_data["runID"] == participant_id_selection])
-
-
-        feedback_data = retrieve_feedback_data(os.path.join(path, uploaded_db_file.name))
-
-        schema = print_schema(os.path.join(path, uploaded_db_file.name))
+        # Only the selected participant's rows are read from here on
+        compact_dtypes = st.sidebar.checkbox("Compact sensor dtypes (less memory):")
+        participant_data = ediary2_dataset.EDiaryDataset(db_source, run_id=participant_id_selection,
+                                                         compact=compact_dtypes)
 
         if feedback_data_display:
-            st.write("Feedback data: ", feedback_data[feedback_data["runID"] == participant_id_selection])
+            st.write("Feedback data: ", participant_data.feedback)
+
+            # Physiology in windows before / after each answer, from the (cached) sensor streams of the run
+            window_minutes = st.sidebar.number_input("Feedback window (minutes before / after):", min_value=1, value=5)
+            feature_windows = [("before", -60 * window_minutes, 0), ("after", 0, 60 * window_minutes)]
+            feature_sensors = participant_data.sensors(sorted(set(ediary2_features.FEATURE_SENSORS.values())))
+            st.write("Physiology around feedback: ",
+                     ediary2_features.feedback_features(participant_data.feedback, feature_sensors, feature_windows))
         
         if location_data_display:
-            st.write("Raw locations table Data: ", location_data[location_data["runID"] == participant_id_selection])
-
-            map = create_map_with_track_and_MOS(location_data[location_data["runID"] == participant_id_selection])
-            st_map = st_folium(map, width=1000)
-
-            #speed_fig = px.line(location_data[location_data["runID"] == participant_id_selection], 
+            location_data = participant_data.location
+            st.write("Raw locations table Data: ", location_data)
+
+            # All detail levels are simplified once per run; switching level only picks another one
+            track_detail_m = st.sidebar.select_slider("Track detail (tolerance in m):", options=ediary2_geo.DETAIL_LEVELS_M,
+                                                      value=ediary2_geo.DETAIL_LEVELS_M[1])
+            track = participant_data.track_levels[track_detail_m]
+            st.write("Track vertices drawn: ", len(track), " of ", len(location_data))
+
+            with ediary2_profiling.stage("map") as record:
+                map = ediary2_plotting.create_map_with_track_and_MOS(location_data, track=track)
+                st_map = st_folium(map, width=1000)
+                record["rows"] = len(track)
+
+            # Fixes around each feedback answer, from the spatial index of the run (built once per run)
+            feedback_radius_m = st.sidebar.number_input("Fixes near feedback (radius in m):", min_value=1, value=50)
+            with ediary2_profiling.stage("fixes near feedback") as record:
+                near_feedback = ediary2_geo.fixes_near_feedback(participant_data.location_index, participant_data.feedback,
+                                                                feedback_radius_m)
+                record["rows"] = len(near_feedback)
+            st.write("Fixes near feedback: ", near_feedback)
+
+            #speed_fig = px.line(location_data, 
             #        x = "timestamp_utc", y = "altitude", title = "Speed over time")
             
             #st.ploty_chart(speed_fig)
 
         if sensor_data_display:
 
-            worn_status = ediary2.retrieve_all_worn_status_data(os.path.join(path, uploaded_db_file.name), table_name="longEventData")
-            #st.write(worn_status)
-
-            color_status = ediary2.retrieve_all_color_data(os.path.join(path, uploaded_db_file.name), table_name="longEventData")
-            #st.write(color_status)
-
-            battery_status = ediary2.retrieve_all_battery_data(os.path.join(path, uploaded_db_file.name), table_name="longEventData")
-            #st.write(battery_status)
-
-            vector_mag = ediary2.retrieve_all_vector_mag_units_data(os.path.join(path, uploaded_db_file.name), table_name="doubleEventData")
-            #st.write(vector_mag)
-
-            acc_min = ediary2.retrieve_all_acc_min_data(os.path.join(path, uploaded_db_file.name), table_name="doubleEventData")
-            #st.write(acc_min)
-
-            acc_peak = ediary2.retrieve_all_acc_peak_data(os.path.join(path, uploaded_db_file.name), table_name="doubleEventData")
-            #st.write(acc_peak)
-
-
-            ### BREATHING WAVE AMPLITUDE
-            st.write("Breathing Wave Amplitude:")
-            st.write("Nunber of recordings for BWA: ", len(breathing_wave_amplitude[breathing_wave_amplitude["runID"] == participant_id_selection]))
-            st.write("Sampling Frequency (# of recordings / total seconds) is: ", len(breathing_wave_amplitude[breathing_wave_amplitude["runID"] == participant_id_selection]) / run_duration.seconds)
-            # plot data
-            bwa_fig = px.line(breathing_wave_amplitude[breathing_wave_amplitude["runID"] == participant_id_selection], 
-                    x = "timestamp_utc", y = "BWA", title = "Breathing wave amplitude")
-            st.plotly_chart(bwa_fig)
-
-            ### POSTURE
-            st.write("Posture:")
-            st.write("Nunber of recordings for posture: ", len([posture[posture["runID"] == participant_id_selection]]))
-            st.write("Sampling Frequency (# of recordings / total seconds) is: ", len(posture[posture["runID"] == participant_id_selection]) / run_duration.seconds)
-            posture_fig = px.line(posture[posture["runID"] == participant_id_selection],
-                                   x = "timestamp_utc", y = "posture", title = "Posture")
-            st.plotly_chart(posture_fig)
-
-            ### HEART RATE
-            st.write("Heart Rate:")
-            st.write("Nunber of recordings for heart rate: ", len(heart_rate[heart_rate["runID"] == participant_id_selection]))
-            st.write("Sampling Frequency (# of recordings / total seconds) is: ", len(heart_rate[heart_rate["runID"] == participant_id_selection]) / run_duration.seconds)
-            heart_rate_fig = px.line(heart_rate[heart_rate["runID"] == participant_id_selection],
-                                      x = "timestamp_utc", y = "heart_rate", title = "Heart Rate")
-            st.plotly_chart(heart_rate_fig)
-
-            ### RESPIRATION RATE
-            st.write("Respiration Rate:")
-            st.write("Nunber of recordings for respiration rate: ", len(resp_rate[resp_rate["runID"] == participant_id_selection]))
-            st.write("Sampling Frequency (# of recordings / total seconds) is: ", len(resp_rate[resp_rate["runID"] == participant_id_selection]) / run_duration.seconds)
-            resp_rate_fig = px.line(resp_rate[resp_rate["runID"] == participant_id_selection], 
-                    x = "timestamp_utc", y = "resp_rate", title = "Respiration Rate")
-            st.plotly_chart(resp_rate_fig)
-
-            ### ECG AMPLITUDE
-            st.write("ECG Amplitude:")
-            st.write("Nunber of recordings for ECG amplitude: ", len(ecg_amplitude[ecg_amplitude["runID"] == participant_id_selection]))
-            st.write("Sampling Frequency (# of recordings / total seconds) is: ", len(ecg_amplitude[ecg_amplitude["runID"] == participant_id_selection]) / run_duration.seconds)
-            ecg_amplitude_fig = px.line(ecg_amplitude[ecg_amplitude["runID"] == participant_id_selection],
-                     x = "timestamp_utc", y = "ecg_ampl", title = "ECG Amplitude")
-            st.plotly_chart(ecg_amplitude_fig)
-
-            ### ECG NOISE
-            st.write("ECG Noise:")
-            st.write("Nunber of recordings for ECG noise: ", len(ecg_noise[ecg_noise["runID"] == participant_id_selection]))
-            st.write("Sampling Frequency (# of recordings / total seconds) is: ", len(ecg_noise[ecg_noise["runID"] == participant_id_selection]) / run_duration.seconds)
-            ecg_noise_fig = px.line(ecg_noise[ecg_noise["runID"] == participant_id_selection],
-                     x = "timestamp_utc", y = "ecg_noise", title = "ECG Noise")
-            st.plotly_chart(ecg_noise_fig)
-
+            # Read doubleEventData and longEventData once each for all charted sensors
+            sensor_data = participant_data.sensors([sensor for sensor, _, _ in ediary2_plotting.DASHBOARD_CHANNELS],
+                                                   start=chart_start, end=chart_end)
+
+            ### DATA QUALITY
+            # Intervals, gaps, duplicates and coverage of every charted sensor over the selected time range
+            chart_bounds = {participant_id_selection: tuple(int(pd.Timestamp(bound, tz="UTC").value // 10**6)
+                                                            for bound in chart_range)}
+            with ediary2_profiling.stage("data quality"):
+                st.write("Sensor data quality in the selected time range:")
+                st.write(ediary2_quality.quality_report(sensor_data, run_bounds=chart_bounds))
+                with st.expander("Gaps"):
+                    st.write(pd.concat([ediary2_quality.find_gaps(frame, sensor, run_bounds=chart_bounds)
+                                        for sensor, frame in sensor_data.items()], ignore_index=True))
+
+            ### SENSOR DASHBOARD
+
+            # One figure for all channels: a single payload per rerun and one linked zoom
+            with ediary2_profiling.stage("dashboard figure"):
+                dashboard_fig = ediary2_plotting.sensor_dashboard(sensor_data, n_out=max_chart_points)
+            with ediary2_profiling.stage("dashboard render"):
+                st.plotly_chart(dashboard_fig, use_container_width=True)
+
+        if aligned_data_display:
+            ### ALIGNED SENSOR AND LOCATION DATA
+            aligned_freq = st.sidebar.selectbox("Aligned data frequency:", ["1s", "5s", "10s", "30s", "1min"])
+
+            # One row per time bin: sensors aggregated per ediary2_resample.AGGREGATIONS, locations averaged
+            aligned_streams = participant_data.sensors([sensor for sensor, _, _ in ediary2_plotting.DASHBOARD_CHANNELS],
+                                                       start=chart_start, end=chart_end)
+            aligned_streams["location"] = participant_data.location
+            with ediary2_profiling.stage("aligned data") as record:
+                aligned_data = ediary2_resample.resample_run(aligned_streams, freq=aligned_freq,
+                                                             columns={"location": ["latitude", "longitude", "speed", "altitude"]},
+                                                             start=chart_range[0], end=chart_range[1])
+                record["rows"] = len(aligned_data)
+
+            st.write("Aligned data: ", aligned_data)
+            st.download_button("Download aligned data (.csv)", aligned_data.to_csv().encode(),
+                               file_name=f"aligned_run_{participant_id_selection}.csv", mime="text/csv")
 
     except:
-        pass
\ No newline at end of file
+        pass
+
+if profile_records is not None:
+    with st.sidebar.expander("Performance", expanded=True):
+        st.write(ediary2_profiling.summarize(profile_records))
+        st.download_button("Download timings (.json)", ediary2_profiling.export_json(profile_records),
+                           file_name="ediary2_profile.json", mime="application/json")